@@ -0,0 +1,103 @@
+# api.py
+# Running the disassembler and simulator from Python on programs held in memory. Nothing here reads or writes
+# files or prints; the results come back as objects.
+#
+#   result = simulate_program(words, max_cycles=10000)
+#   result.halted, result.cycles, result.stats["load_stalls"], result.registers[5], result.memory.get(600, 0)
+#
+# A program is any of
+#   list/tuple of 32 bit instruction words (ints), or any other iterable of them
+#   bytes / bytearray / memoryview --> raw little-endian image, same as a .bin file
+#   str  --> '0'/'1' lines, same as the text input format
+# The image starts at address 496 like every other input, everything after the first RET is data
+
+from disassembler import Disassembler
+from input_formats import words_from_text, words_from_bytes
+from pipeline_simulator import PipelineSimulator
+from trace_writer import StringTraceWriter
+
+
+class SimulationResult:
+    # What one simulate_program() run ended with
+    #   halted    --> the program finished (pipeline drained or a branch was taken) rather than running out of cycles
+    #   stats     --> summary() counters: cycles, stalls, forwardings per path
+    #   registers --> list of the 32 register values
+    #   memory    --> {address: value} of every nonzero data memory word
+    #   trace     --> the full trace text when it was asked for, otherwise None
+
+    def __init__(self, halted, cycles, pc, retired, stats, registers, memory, trace=None):
+        self.halted = halted
+        self.cycles = cycles
+        self.pc = pc
+        self.retired = retired
+        self.stats = stats
+        self.registers = registers
+        self.memory = memory
+        self.trace = trace
+
+    @property
+    def ipc(self):
+        return self.retired / self.cycles if self.cycles else 0.0
+
+    def to_dict(self):
+        # Plain data, e.g. for json.dump (memory keys become strings there)
+        return {
+            "halted": self.halted,
+            "cycles": self.cycles,
+            "pc": self.pc,
+            "retired": self.retired,
+            "ipc": self.ipc,
+            "stats": dict(self.stats),
+            "registers": list(self.registers),
+            "memory": dict(self.memory),
+            "trace": self.trace,
+        }
+
+    def __repr__(self):
+        return f"SimulationResult(halted={self.halted}, cycles={self.cycles}, retired={self.retired})"
+
+
+def program_words(program):
+    if isinstance(program, str):
+        return words_from_text(program)
+    if isinstance(program, (bytes, bytearray, memoryview)):
+        return words_from_bytes(bytes(program))
+    return list(program)
+
+
+def decode_program(program):
+    # List of DecodedInstruction for the program, what Disassembler.decode() gives for a file
+    return list(Disassembler(None, None).decode_words(program_words(program)))
+
+
+def disassemble_program(program):
+    # The disassembly listing lines, without the newlines
+    return [instruction.text() for instruction in decode_program(program)]
+
+
+def build_simulator(program, trace=False, trace_window=None, memory=None):
+    # PipelineSimulator for the program with its output kept in memory.
+    # trace        --> keep the per-cycle trace text (it's formatted either way only when this is set)
+    # trace_window --> (start, end) cycles of the trace, default every cycle
+    # memory       --> {address: value} written into data memory before the run, after the data section
+    trace_start, trace_end = trace_window if trace_window else (None, None)
+    sim = PipelineSimulator(decode_program(program), trace_start, trace_end,
+                            trace_writer=StringTraceWriter(summary_only=not trace))
+    sim.memory.load_words((memory or {}).items())
+    return sim
+
+
+def collect_result(sim, halted):
+    trace = sim.trace_writer.getvalue() if not sim.trace_writer.summary_only else None
+    return SimulationResult(halted, sim.clock_cycle, sim.pc, sim.retired, sim.summary(), list(sim.registers),
+                            {address: value for address, value in sim.memory.touched_words() if value}, trace)
+
+
+def simulate_program(program, max_cycles=None, trace=False, trace_window=None, memory=None):
+    # Runs the program until it halts, or for at most max_cycles cycles (None = no limit, a program that never
+    # halts then never returns). Returns a SimulationResult
+    sim = build_simulator(program, trace, trace_window, memory)
+    halted = sim.run(max_cycles)
+    if trace:
+        sim.print_final_summary()
+    return collect_result(sim, halted)
@@ -0,0 +1,199 @@
+# benchmark.py
+# Generates synthetic workloads (see workloads.py), then times disassembly and pipeline simulation separately
+# and measures their peak Python memory. Results are written as JSON so runs from different versions can be
+# compared.
+#
+# Usage: python benchmark.py [results.json] [--workloads alu,load_use,...] [--instructions n] [--cycles n]
+#                            [--format text|bin|hex] [--repeat n] [--seed n] [--trace] [--compare old.json]
+#
+# Each workload result:
+#   words, disassemble_seconds, words_per_second, disassemble_peak_bytes
+#   cycles, simulate_seconds, cycles_per_second, summary_seconds, simulate_peak_bytes, plus the simulator's
+#   summary() counters
+# simulate_seconds only covers the cycle loop, writing the final summary (and closing the trace) is summary_seconds.
+# Times are the best of --repeat runs. Peak memory comes from a separate run under tracemalloc, which would
+# otherwise slow the timed runs down
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+from disassembler import Disassembler
+from pipeline_simulator import PipelineSimulator
+from trace_writer import TraceWriter
+from workloads import PRESETS, EXTENSIONS, generate_preset, write_program
+
+DEFAULT_INSTRUCTIONS = 4096
+DEFAULT_CYCLES = 20000
+
+
+def best_time(function, repeat):
+    # Runs function repeat times, returns (fastest wall time, result of the last run)
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def peak_memory(function):
+    # Highest traced allocation total while function runs, in bytes
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_disassembly(input_file_name, listing_file_name, input_format, repeat):
+    def run():
+        return Disassembler(input_file_name, listing_file_name, input_format=input_format).disassemble()
+
+    seconds, words = best_time(run, repeat)
+    return {
+        "words": words,
+        "disassemble_seconds": seconds,
+        "words_per_second": words / seconds if seconds else None,
+        "disassemble_peak_bytes": peak_memory(run),
+    }
+
+
+def bench_simulation(records, cycles, trace_file_name, repeat):
+    # trace_file_name --> write the full trace there, None runs summary only
+    def new_simulator():
+        if trace_file_name and os.path.exists(trace_file_name):
+            os.remove(trace_file_name)  # TraceWriter appends
+        trace_writer = TraceWriter(trace_file_name, echo=False, summary_only=trace_file_name is None)
+        return PipelineSimulator(records, 0, cycles, trace_writer=trace_writer)
+
+    # Building the simulator (decoding the records) isn't part of the timed run
+    best = None
+    best_summary = None
+    sim = None
+    for _ in range(repeat):
+        sim = new_simulator()
+        start = time.perf_counter()
+        sim.run(cycles)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+        start = time.perf_counter()
+        sim.print_final_summary()
+        sim.trace_writer.close()
+        elapsed = time.perf_counter() - start
+        if best_summary is None or elapsed < best_summary:
+            best_summary = elapsed
+
+    result = {
+        "cycles": sim.clock_cycle,
+        "simulate_seconds": best,
+        "cycles_per_second": sim.clock_cycle / best if best else None,
+        "summary_seconds": best_summary,
+        "simulate_peak_bytes": peak_memory(lambda: new_simulator().simulate()),
+    }
+    result.update(sim.summary())
+    return result
+
+
+def run_workload(name, work_dir, instructions, cycles, input_format, repeat, seed, trace):
+    words = generate_preset(name, instructions, seed=seed)
+    input_file_name = os.path.join(work_dir, name + EXTENSIONS[input_format])
+    listing_file_name = os.path.join(work_dir, name + "_listing.txt")
+    write_program(words, input_file_name, input_format)
+
+    row = {"workload": name}
+    row.update(bench_disassembly(input_file_name, listing_file_name, input_format, repeat))
+    records = Disassembler(input_file_name, None, input_format=input_format).decode()
+    trace_file_name = os.path.join(work_dir, name + "_trace.txt") if trace else None
+    row.update(bench_simulation(records, cycles, trace_file_name, repeat))
+    return row
+
+
+def source_version():
+    # Commit the simulator was run from, so results files say what they measured
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(workloads=None, instructions=DEFAULT_INSTRUCTIONS, cycles=DEFAULT_CYCLES, input_format="text",
+                   repeat=3, seed=0, trace=False, work_dir=None):
+    # Returns the results document that gets written as JSON
+    workloads = workloads or list(PRESETS)
+    settings = {"instructions": instructions, "cycles": cycles, "format": input_format, "repeat": repeat,
+                "seed": seed, "trace": trace}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        results = [run_workload(name, work_dir or temp_dir, instructions, cycles, input_format, repeat, seed, trace)
+                   for name in workloads]
+    return {
+        "version": source_version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": settings,
+        "results": results,
+    }
+
+
+def print_results(document, baseline=None):
+    # baseline --> an older results document, adds the speed ratio new/old for each workload
+    old = {row["workload"]: row for row in baseline["results"]} if baseline else {}
+    print(f"{'workload':<10}{'words/s':>12}{'cycles/s':>12}{'summary ms':>12}{'dis peak KB':>13}{'sim peak KB':>13}")
+    for row in document["results"]:
+        line = f"{row['workload']:<10}{row['words_per_second']:>12.0f}{row['cycles_per_second']:>12.0f}" \
+               f"{row['summary_seconds'] * 1000:>12.1f}{row['disassemble_peak_bytes'] / 1024:>13.0f}{row['simulate_peak_bytes'] / 1024:>13.0f}"
+        previous = old.get(row["workload"])
+        if previous:
+            line += f"   x{row['words_per_second'] / previous['words_per_second']:.2f} dis" \
+                    f"  x{row['cycles_per_second'] / previous['cycles_per_second']:.2f} sim"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RISC-V Simulator benchmarks")
+    parser.add_argument("output_file_name", nargs="?", help="write the results here as JSON")
+    parser.add_argument('--workloads', metavar="a,b", help=f"comma separated, from {', '.join(PRESETS)} (default: all)")
+    parser.add_argument('--instructions', metavar="n", type=int, default=DEFAULT_INSTRUCTIONS,
+                        help="Instructions in each workload's loop body")
+    parser.add_argument('--cycles', metavar="n", type=int, default=DEFAULT_CYCLES, help="Cycles simulated per workload")
+    parser.add_argument('--format', choices=list(EXTENSIONS), default="text", help="Input format of the generated programs")
+    parser.add_argument('--repeat', metavar="n", type=int, default=3, help="Timed runs per measurement, the best one counts")
+    parser.add_argument('--seed', metavar="n", type=int, default=0, help="Workload generator seed")
+    parser.add_argument('--trace', action='store_true', help="Simulate with the full per-cycle trace written to a file")
+    parser.add_argument('--keep', metavar="dir", help="Keep the generated programs, listings and traces in dir")
+    parser.add_argument('--compare', metavar="file", help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    workloads = args.workloads.split(",") if args.workloads else None
+    for name in workloads or []:
+        if name not in PRESETS:
+            parser.error(f"unknown workload {name}")
+    if args.keep:
+        os.makedirs(args.keep, exist_ok=True)
+
+    document = run_benchmarks(workloads, args.instructions, args.cycles, args.format, args.repeat, args.seed,
+                              args.trace, args.keep)
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            baseline = json.load(file)
+    print_results(document, baseline)
+    if args.output_file_name:
+        with open(args.output_file_name, 'w') as file:
+            json.dump(document, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
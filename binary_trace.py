@@ -0,0 +1,193 @@
+# binary_trace.py
+# Compact per-cycle binary trace plus a reader that can jump straight to any cycle
+#
+# File layout (all little endian):
+#   header  : magic "RVTR", version u16
+#   records : one per traced cycle, see RECORD_HEADER below, followed by its variable length parts
+#   index   : u64 cycle numbers, then u64 record offsets, one entry each per record
+#   footer  : index offset u64, record count u64, magic "RVTR"
+#
+# A record holds the cycle, PC, the 8 stage occupants, every latch, the register and memory words that changed
+# and the stall/forward events of that cycle. Every KEYFRAME_INTERVAL records the full register file is stored
+# instead of only the changed registers, so registers can be rebuilt without reading from the start.
+
+import mmap
+import struct
+from array import array
+from bisect import bisect_left
+
+from pipeline_state import STAGES, instruction_code
+
+MAGIC = b"RVTR"
+VERSION = 1
+FILE_HEADER = struct.Struct("<4sH")
+FOOTER = struct.Struct("<QQ4s")
+
+# cycle, pc, 8 stage codes, IF/IS.NPC, IS/ID.IR code, 7 numeric latches, flags, #registers, #memory words, #events
+RECORD_HEADER = struct.Struct("<Qq8iqi7qBBHB")
+REGISTER_DELTA = struct.Struct("<Bq")
+# Effective addresses can be negative (SW x1, -8(x0)), so the address is signed like everything but the cycle
+MEMORY_DELTA = struct.Struct("<qq")
+EVENT = struct.Struct("<BB")
+
+FLAG_STALL = 1      # load stall active this cycle
+FLAG_KEYFRAME = 2   # register deltas are the full register file
+
+EVENT_LOAD_STALL = 0
+EVENT_BRANCH_FLUSH = 1
+EVENT_FORWARD = 2   # second byte is the index into FORWARDING_PATHS
+
+FORWARDING_PATHS = ("EX/DF -> RF/EX", "DF/DS -> EX/DF", "DF/DS -> RF/EX", "DS/WB -> EX/DF", "DS/WB -> RF/EX")
+
+KEYFRAME_INTERVAL = 1024
+
+
+class BinaryTraceWriter:
+
+    def __init__(self, file_name, keyframe_interval=KEYFRAME_INTERVAL):
+        self.file = open(file_name, 'wb')
+        self.file.write(FILE_HEADER.pack(MAGIC, VERSION))
+        self.keyframe_interval = keyframe_interval
+        self.cycles = array('Q')
+        self.offsets = array('Q')
+        self.previous_registers = None
+        self.previous_branch_stalls = 0
+
+    def write_cycle(self, sim):
+        # Called by PipelineSimulator once per traced cycle, at the same point the text trace is printed
+        latches = sim.pipeline_registers
+        registers = sim.registers
+
+        keyframe = len(self.cycles) % self.keyframe_interval == 0
+        if keyframe:
+            register_deltas = list(enumerate(registers))
+        else:
+            previous = self.previous_registers
+            register_deltas = [(i, value) for i, value in enumerate(registers) if value != previous[i]]
+        self.previous_registers = registers[:]
+
+        memory_deltas = [sim.stored_word] if sim.stored_word is not None else []
+
+        events = []
+        if sim.stall_flag:
+            events.append((EVENT_LOAD_STALL, 0))
+        if sim.branch_stalls != self.previous_branch_stalls:
+            events.append((EVENT_BRANCH_FLUSH, 0))
+            self.previous_branch_stalls = sim.branch_stalls
+        for i, path in enumerate(FORWARDING_PATHS):
+            if sim.forwarding_print[path]:
+                events.append((EVENT_FORWARD, i))
+
+        flags = (FLAG_STALL if sim.stall_flag else 0) | (FLAG_KEYFRAME if keyframe else 0)
+        parts = [RECORD_HEADER.pack(
+            sim.clock_cycle, sim.pc,
+            *[instruction_code(instr) for instr in sim.pipeline.values()],
+            latches.if_is_npc, instruction_code(latches.is_id_ir),
+            latches.rf_ex_a, latches.rf_ex_b, latches.ex_df_aluout, latches.ex_df_b,
+            latches.df_ds_aluout_lmd, latches.df_ds_aluout_lmd_b, latches.ds_wb_aluout_lmd,
+            flags, len(register_deltas), len(memory_deltas), len(events))]
+        parts.extend(REGISTER_DELTA.pack(reg, value) for reg, value in register_deltas)
+        parts.extend(MEMORY_DELTA.pack(address, value) for address, value in memory_deltas)
+        parts.extend(EVENT.pack(kind, detail) for kind, detail in events)
+
+        self.cycles.append(sim.clock_cycle)
+        self.offsets.append(self.file.tell())
+        self.file.write(b"".join(parts))
+
+    def close(self):
+        if self.file is None:
+            return
+        index_offset = self.file.tell()
+        self.file.write(self.cycles.tobytes())
+        self.file.write(self.offsets.tobytes())
+        self.file.write(FOOTER.pack(index_offset, len(self.cycles), MAGIC))
+        self.file.close()
+        self.file = None
+
+
+class CycleRecord:
+    __slots__ = ("cycle", "pc", "stages", "latches", "stall", "keyframe", "register_deltas", "memory_deltas", "events")
+
+    def stage_codes(self):
+        # {stage: instruction index or negative bubble code}
+        return dict(zip(STAGES, self.stages))
+
+    def forwards(self):
+        return [FORWARDING_PATHS[detail] for kind, detail in self.events if kind == EVENT_FORWARD]
+
+
+class BinaryTraceReader:
+
+    def __init__(self, file_name):
+        self.file = open(file_name, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = FILE_HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{file_name} is not a version {VERSION} binary trace")
+        index_offset, count, magic = FOOTER.unpack_from(self.data, len(self.data) - FOOTER.size)
+        if magic != MAGIC:
+            raise ValueError(f"{file_name} is truncated (no index)")
+        # Index is read straight out of the mapping, nothing is scanned
+        self.cycles = memoryview(self.data)[index_offset:index_offset + 8 * count].cast('Q')
+        self.offsets = memoryview(self.data)[index_offset + 8 * count:index_offset + 16 * count].cast('Q')
+
+    def __len__(self):
+        return len(self.cycles)
+
+    def __iter__(self):
+        for i in range(len(self.cycles)):
+            yield self.read_record(i)
+
+    def find(self, cycle):
+        # Position of the record for cycle, KeyError if that cycle wasn't traced
+        i = bisect_left(self.cycles, cycle)
+        if i == len(self.cycles) or self.cycles[i] != cycle:
+            raise KeyError(cycle)
+        return i
+
+    def record_at(self, cycle):
+        return self.read_record(self.find(cycle))
+
+    def read_record(self, i):
+        offset = self.offsets[i]
+        fields = RECORD_HEADER.unpack_from(self.data, offset)
+        offset += RECORD_HEADER.size
+        record = CycleRecord()
+        record.cycle = fields[0]
+        record.pc = fields[1]
+        record.stages = fields[2:10]
+        record.latches = fields[10:19]
+        flags, register_count, memory_count, event_count = fields[19:]
+        record.stall = bool(flags & FLAG_STALL)
+        record.keyframe = bool(flags & FLAG_KEYFRAME)
+        record.register_deltas = []
+        for _ in range(register_count):
+            record.register_deltas.append(REGISTER_DELTA.unpack_from(self.data, offset))
+            offset += REGISTER_DELTA.size
+        record.memory_deltas = []
+        for _ in range(memory_count):
+            record.memory_deltas.append(MEMORY_DELTA.unpack_from(self.data, offset))
+            offset += MEMORY_DELTA.size
+        record.events = []
+        for _ in range(event_count):
+            record.events.append(EVENT.unpack_from(self.data, offset))
+            offset += EVENT.size
+        return record
+
+    def registers_at(self, cycle):
+        # Full register file at the end of cycle, replayed from the closest keyframe at or before it
+        end = self.find(cycle)
+        start = end
+        while not self.read_record(start).keyframe:
+            start -= 1
+        registers = [0] * 32
+        for i in range(start, end + 1):
+            for reg, value in self.read_record(i).register_deltas:
+                registers[reg] = value
+        return registers
+
+    def close(self):
+        self.cycles.release()
+        self.offsets.release()
+        self.data.close()
+        self.file.close()
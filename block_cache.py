@@ -0,0 +1,98 @@
+# block_cache.py
+# Translation cache for the functional model. A basic block (straight line code up to and including the next
+# BEQ/BNE/BLT/BGE/J/JAL/JALR) is turned into Python source once, compiled, and the resulting function runs the
+# whole block on the register file and memory in one call. Blocks are kept in an LRU keyed by start address.
+# Code is read-only: instructions are fetched from the decoded program, SW only writes data memory (same as the
+# pipeline model), so a cached block never goes stale.
+
+from collections import OrderedDict
+
+from memory import to_word
+
+BLOCK_END = ["BEQ", "BNE", "BLT", "BGE", "J", "JAL", "JALR"]
+BRANCH_CONDITION = {"BEQ": "==", "BNE": "!=", "BLT": "<", "BGE": ">="}
+ALU_OPERATOR = {"ADD": "+", "SUB": "-", "SLL": "<<", "SRL": ">>", "AND": "&", "OR": "|", "XOR": "^"}
+# Results of these can leave 32 bits and are wrapped (w = memory.to_word), the rest stay in range
+WRAPPING_OPERATIONS = ["ADD", "SUB", "SLL"]
+
+MAX_BLOCK_LENGTH = 64
+
+
+class Block:
+    __slots__ = ("start", "end", "length", "run")
+
+    def __init__(self, start, end, length, run):
+        self.start = start     # address of the first instruction
+        self.end = end         # address just past the last instruction
+        self.length = length   # instructions in the block
+        self.run = run         # run(registers, memory) -> (next pc, instructions executed, halted)
+
+
+class BlockCache:
+
+    def __init__(self, decoded_instructions, max_blocks=256):
+        self.decoded_instructions = decoded_instructions
+        self.code_end = 496 + len(decoded_instructions) * 4
+        self.max_blocks = max_blocks
+        self.blocks = OrderedDict()   # start address -> Block, least recently used first
+        self.compiled = 0
+
+    def lookup(self, pc):
+        block = self.blocks.get(pc)
+        if block is None:
+            block = self.translate(pc)
+            self.blocks[pc] = block
+            if len(self.blocks) > self.max_blocks:
+                self.blocks.popitem(last=False)
+        else:
+            self.blocks.move_to_end(pc)
+        return block
+
+    def translate(self, start):
+        # Source for one block. Each instruction becomes the same statement the interpreter in
+        # functional_simulator runs for it, with register numbers and immediates filled in as constants
+        lines = ["def block(r, m):"]
+        pc = start
+        length = 0
+        while pc < self.code_end and length < MAX_BLOCK_LENGTH:
+            instruction = self.decoded_instructions[(pc - 496) // 4]
+            operation = instruction.operation
+            regs = instruction.regs
+            imm = instruction.imm
+            length += 1
+
+            if operation in WRAPPING_OPERATIONS:
+                lines.append(f"    r[{regs[0]}] = w(r[{regs[1]}] {ALU_OPERATOR[operation]} r[{regs[2]}])")
+            elif operation in ALU_OPERATOR:
+                lines.append(f"    r[{regs[0]}] = r[{regs[1]}] {ALU_OPERATOR[operation]} r[{regs[2]}]")
+            elif operation == "ADDI":
+                lines.append(f"    r[{regs[0]}] = w(r[{regs[1]}] + {imm})")
+            elif operation == "SLT":
+                lines.append(f"    r[{regs[0]}] = 1 if r[{regs[1]}] < r[{regs[2]}] else 0")
+            elif operation == "SLTI":
+                lines.append(f"    r[{regs[0]}] = 1 if r[{regs[1]}] < {imm} else 0")
+            elif operation == "LW":
+                lines.append(f"    r[{regs[0]}] = m[r[{instruction.base}] + {imm}]")
+            elif operation == "SW":
+                lines.append(f"    m[r[{instruction.base}] + {imm}] = r[{regs[0]}]")
+            elif operation in BRANCH_CONDITION:
+                # Taken branch halts, same as the pipeline model
+                lines.append(f"    if r[{regs[0]}] {BRANCH_CONDITION[operation]} r[{regs[1]}]:")
+                lines.append(f"        return {pc + imm}, {length}, True")
+            elif operation == "J":
+                lines.append(f"    return {imm}, {length}, False")
+            elif operation == "JAL":
+                lines.append(f"    r[{regs[0]}] = {pc + 4}")
+                lines.append(f"    return {pc + imm}, {length}, False")
+            # anything else (NOP, data words, JALR) doesn't change state
+
+            pc += 4
+            if operation in BLOCK_END:
+                break
+        if not lines[-1].startswith("    return"):
+            lines.append(f"    return {pc}, {length}, False")
+
+        namespace = {"w": to_word}
+        exec(compile("\n".join(lines), f"<block {start}>", "exec"), namespace)
+        self.compiled += 1
+        return Block(start, pc, length, namespace["block"])
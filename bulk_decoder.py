@@ -0,0 +1,132 @@
+# bulk_decoder.py
+# Vectorized decode of a whole instruction image with NumPy. Every field and immediate is pulled out as a
+# column operation over the uint32 array, the result is the same list of DecodedInstruction the scalar
+# Disassembler.decode_instruction / decode_data path gives. NumPy is optional, see available()
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import os
+
+from disassembler import DecodedInstruction, DISPATCH_INDEX, MNEMONIC_FORMAT
+from input_formats import detect_format, text_lines, hex_words
+
+
+def available():
+    return np is not None
+
+
+def words_from_lines(lines):
+    # lines --> stripped 32 character '0'/'1' strings. Returns a uint32 array, MSB first like int(line, 2)
+    if not lines:
+        return np.zeros(0, dtype=np.uint32)
+    bits = np.frombuffer("".join(lines).encode(), dtype=np.uint8).reshape(-1, 32) - ord('0')
+    if (bits > 1).any():
+        bad = int(np.flatnonzero((bits > 1).any(axis=1))[0])
+        raise ValueError(f"invalid literal for int() with base 2: {lines[bad]!r}")
+    return np.packbits(bits, axis=1).view('>u4').reshape(-1).astype(np.uint32)
+
+
+def read_word_array(file_name, input_format="auto"):
+    # The whole image as a uint32 array, for any of the input_formats
+    if input_format == "auto":
+        input_format = detect_format(file_name)
+    if input_format == "bin":
+        size = os.path.getsize(file_name)
+        if size % 4:
+            print("Wrong file length")
+        if size < 4:
+            return np.zeros(0, dtype=np.uint32)
+        image = np.memmap(file_name, dtype='<u4', mode='r', shape=(size // 4,))
+        words = image.astype(np.uint32)
+        del image
+        return words
+    if input_format == "hex":
+        return np.fromiter(hex_words(file_name), dtype=np.uint32)
+    return words_from_lines(list(text_lines(file_name)))
+
+
+def sign_extend(values, bits):
+    values = values.astype(np.int64)
+    return values - ((values & (1 << (bits - 1))) << 1)
+
+
+def decode_fields(words):
+    # Column-wise split of every word into its fields and all immediate formats (sign extended)
+    words = words.astype(np.int64)
+    return {
+        "opcode": words & 0b1111111,
+        "rd": (words >> 7) & 0b11111,
+        "funct3": (words >> 12) & 0b111,
+        "rs1": (words >> 15) & 0b11111,
+        "rs2": (words >> 20) & 0b11111,
+        "funct7": (words >> 25) & 0b1111111,
+        "imm_i": sign_extend((words >> 20) & 0b111111111111, 12),
+        "imm_s": sign_extend(((words >> 25) << 5) | ((words >> 7) & 0b11111), 12),
+        "imm_b": sign_extend(((words >> 31) & 0b1) << 12 | ((words >> 25) & 0b111111) << 5 |
+                             ((words >> 8) & 0b1111) << 1 | ((words >> 7) & 0b1) << 11, 13),
+        "imm_j": sign_extend(((words >> 31) & 0b1) << 20 | ((words >> 12) & 0b11111111) << 12 |
+                             ((words >> 20) & 0b1) << 11 | ((words >> 21) & 0b1111111111) << 1, 21),
+        # same packing as disassembler.dispatch_key
+        "key": (words & 0b1111111) | ((words >> 5) & 0b1110000000) | ((words >> 15) & 0b11111110000000000),
+    }
+
+
+# Which immediate column each format uses, None = no immediate (0)
+FORMAT_IMMEDIATE = {"R": None, "I": "imm_i", "L": "imm_i", "RET": "imm_i", "S": "imm_s", "B": "imm_b", "J": "imm_j"}
+
+mnemonic_lookup = None
+
+
+def build_mnemonic_lookup():
+    # DISPATCH_INDEX as a dense array over all 2^17 keys, -1 where nothing decodes
+    mnemonics = sorted(set(mnemonic for mnemonic, _ in DISPATCH_INDEX.values()))
+    lookup = np.full(1 << 17, -1, dtype=np.int16)
+    for key, (mnemonic, _) in DISPATCH_INDEX.items():
+        lookup[key] = mnemonics.index(mnemonic)
+    return mnemonics, lookup
+
+
+def decode_bulk(words, start_address=496):
+    # words --> uint32 array of the whole image. Returns the DecodedInstruction list
+    global mnemonic_lookup
+    if mnemonic_lookup is None:
+        mnemonic_lookup = build_mnemonic_lookup()
+    mnemonics, lookup = mnemonic_lookup
+
+    fields = decode_fields(words)
+    mnemonic_ids = lookup[fields["key"]]
+
+    # Everything after the first RET is data
+    ret_positions = np.flatnonzero(mnemonic_ids == mnemonics.index("RET"))
+    code_end = int(ret_positions[0]) + 1 if len(ret_positions) else len(words)
+
+    imm = np.zeros(len(words), dtype=np.int64)
+    for i, mnemonic in enumerate(mnemonics):
+        column = FORMAT_IMMEDIATE[MNEMONIC_FORMAT[mnemonic]]
+        if column is not None:
+            selected = mnemonic_ids == i
+            imm[selected] = fields[column][selected]
+    # Words that don't decode get all fields 0, same as the scalar path
+    unknown = mnemonic_ids < 0
+    rd = np.where(unknown, 0, fields["rd"])
+    rs1 = np.where(unknown, 0, fields["rs1"])
+    rs2 = np.where(unknown, 0, fields["rs2"])
+
+    decoded = []
+    address = start_address
+    word_list = words.tolist()
+    for word, mnemonic_id, rd_value, rs1_value, rs2_value, imm_value in zip(
+            word_list[:code_end], mnemonic_ids[:code_end].tolist(), rd[:code_end].tolist(),
+            rs1[:code_end].tolist(), rs2[:code_end].tolist(), imm[:code_end].tolist()):
+        if mnemonic_id < 0:
+            decoded.append(DecodedInstruction(word, address, None))
+        else:
+            decoded.append(DecodedInstruction(word, address, mnemonics[mnemonic_id], rd_value, rs1_value, rs2_value, imm_value))
+        address += 4
+    for word in word_list[code_end:]:
+        decoded.append(DecodedInstruction(word, address, "DATA", imm=word))
+        address += 4
+    return decoded
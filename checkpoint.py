@@ -0,0 +1,122 @@
+# checkpoint.py
+# Save and restore the complete PipelineSimulator state so a run can be continued from the middle
+
+import gzip
+import hashlib
+import json
+import os
+
+from memory import to_word
+from pipeline_state import STAGES, LATCH_FIELDS, instruction_code, instruction_from_code
+
+CHECKPOINT_VERSION = 2
+
+
+def program_fingerprint(sim):
+    # Checkpoints only make sense for the program they were taken from
+    digest = hashlib.sha1()
+    for instruction in sim.decoded_instructions:
+        digest.update(f"{instruction.address}\t{instruction.string}\n".encode())
+    for address, value in sim.data_section:
+        digest.update(f"{address}\t{value}\n".encode())
+    return digest.hexdigest()
+
+
+def take_snapshot(sim):
+    latches = {}
+    for _, _, attr in LATCH_FIELDS:
+        value = getattr(sim.pipeline_registers, attr)
+        latches[attr] = instruction_code(value) if attr == "is_id_ir" else value
+    return {
+        "version": CHECKPOINT_VERSION,
+        "program": program_fingerprint(sim),
+        "pc": sim.pc,
+        "clock_cycle": sim.clock_cycle,
+        "registers": list(sim.registers),
+        "memory": sim.memory.snapshot(),
+        "stored": sorted(sim.memory.stored),
+        "pipeline": [instruction_code(instr) for instr in sim.pipeline.values()],
+        "latches": latches,
+        "stall_counter": sim.stall_counter,
+        "stall_flag": sim.stall_flag,
+        "is_pipeline_complete": sim.is_pipeline_complete,
+        "scoreboard": [[[issue, ready, instruction_code(producer)] for issue, ready, producer in entries]
+                       for entries in sim.scoreboard.entries],
+        "hazards": [[instruction_code(consumer), [instruction_code(producer) for producer in producers]]
+                    for consumer, producers in sim.hazards.items()],
+        "forwarding_counts": sim.forwarding_counts,
+        "forwarding_print": sim.forwarding_print,
+        "total_stalls": sim.total_stalls,
+        "total_forwardings": sim.total_forwardings,
+        "load_stalls": sim.load_stalls,
+        "branch_stalls": sim.branch_stalls,
+        "other_stalls": sim.other_stalls,
+        "retired": sim.retired,
+    }
+
+
+def restore_snapshot(sim, state):
+    if state.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"unsupported checkpoint version {state.get('version')}")
+    if state["program"] != program_fingerprint(sim):
+        raise ValueError("checkpoint was taken from a different program")
+
+    decoded_instructions = sim.decoded_instructions
+    sim.pc = state["pc"]
+    sim.clock_cycle = state["clock_cycle"]
+    for i, value in enumerate(state["registers"]):
+        sim.registers[i] = to_word(value)
+    sim.memory.restore(state["memory"], state["stored"])
+    for stage, code in zip(STAGES, state["pipeline"]):
+        setattr(sim.pipeline, stage, instruction_from_code(code, decoded_instructions))
+    for attr, value in state["latches"].items():
+        if attr == "is_id_ir":
+            value = instruction_from_code(value, decoded_instructions)
+        setattr(sim.pipeline_registers, attr, value)
+    sim.stall_counter = state["stall_counter"]
+    sim.stall_flag = state["stall_flag"]
+    sim.is_pipeline_complete = state["is_pipeline_complete"]
+    sim.scoreboard.entries = [tuple((issue, ready, instruction_from_code(code, decoded_instructions))
+                                    for issue, ready, code in entries) for entries in state["scoreboard"]]
+    sim.hazards = {instruction_from_code(consumer, decoded_instructions):
+                   [instruction_from_code(code, decoded_instructions) for code in producers]
+                   for consumer, producers in state["hazards"]}
+    sim.forwarding_counts = state["forwarding_counts"]
+    sim.forwarding_print = state["forwarding_print"]
+    sim.load_stalls = state["load_stalls"]
+    sim.branch_stalls = state["branch_stalls"]
+    sim.other_stalls = state["other_stalls"]
+    # The running totals follow from the counters, rebuilt so they always agree with them
+    sim.total_stalls = sim.load_stalls + sim.branch_stalls
+    sim.total_forwardings = sum(sim.forwarding_counts.values())
+    sim.forwardings_printed = sim.total_forwardings
+    sim.retired = state.get("retired", 0)
+    sim.in_flight = sum(1 for instr in sim.pipeline.values() if instr.operation != "NOP")
+    # Next traced cycle starts with a full keyframe
+    sim.traced_cycles = 0
+    sim.previous_trace_state = None
+
+
+def save_checkpoint(sim, file_name):
+    with gzip.open(file_name, 'wt') as file:
+        json.dump(take_snapshot(sim), file, separators=(",", ":"))
+
+
+def load_checkpoint(sim, file_name):
+    with gzip.open(file_name, 'rt') as file:
+        restore_snapshot(sim, json.load(file))
+
+
+def checkpoint_file_name(checkpoint_dir, cycle):
+    return os.path.join(checkpoint_dir, f"cycle_{cycle:010d}.ckpt")
+
+
+def find_checkpoint(checkpoint_dir, cycle):
+    # Latest periodic checkpoint at or before cycle, None if there isn't one
+    best = None
+    for name in os.listdir(checkpoint_dir):
+        if name.startswith("cycle_") and name.endswith(".ckpt"):
+            checkpoint_cycle = int(name[len("cycle_"):-len(".ckpt")])
+            if checkpoint_cycle <= cycle and (best is None or checkpoint_cycle > best):
+                best = checkpoint_cycle
+    return None if best is None else checkpoint_file_name(checkpoint_dir, best)
@@ -2,162 +2,224 @@
 
 import argparse
 
+from input_formats import read_words
+
+
+def sign_extend(num, bits):
+    # num --> immediate value extracted, bits --> number of bits
+    if num & (1 << (bits - 1)): # if number negetive, sign extend with 1s
+        num -= 1 << bits
+    return num
+
+
+# Field extractors, one per instruction format. Each returns (rd, rs1, rs2, imm)
+def extract_r(word):
+    return (word >> 7) & 0b11111, (word >> 15) & 0b11111, (word >> 20) & 0b11111, 0
+
+
+def extract_i(word):
+    # imm in [31-20]
+    return (word >> 7) & 0b11111, (word >> 15) & 0b11111, (word >> 20) & 0b11111, sign_extend((word >> 20) & 0b111111111111, 12)
+
+
+def extract_s(word):
+    # [31-25] and [11-7] are the immediate
+    imm = ((word >> 25) << 5) | (word >> 7) & 0b11111
+    return (word >> 7) & 0b11111, (word >> 15) & 0b11111, (word >> 20) & 0b11111, sign_extend(imm, 12)
+
+
+def extract_b(word):
+    # so branch immediate have two MSB in 31 and 7
+    # order --> [31] [7] [30-25] [11-8]
+    imm = ((word >> 31) & 0b1) << 12 | ((word >> 25) & 0b111111) << 5 | ((word >> 8) & 0b1111) << 1 | ((word >> 7) & 0b1) << 11
+    return (word >> 7) & 0b11111, (word >> 15) & 0b11111, (word >> 20) & 0b11111, sign_extend(imm, 13)
+
+
+def extract_j(word):
+    # order = [31] [19-12] [20] [30-21] (bit position), imm is length 21
+    imm = ((word >> 31) & 0b1) << 20 | ((word >> 12) & 0b11111111) << 12 | ((word >> 20) & 0b1) << 11 | ((word >> 21) & 0b1111111111) << 1
+    return (word >> 7) & 0b11111, (word >> 15) & 0b11111, (word >> 20) & 0b11111, sign_extend(imm, 21)
+
+
+# format --> (field extractor, listing text after the address)
+FORMATS = {
+    "R": (extract_r, "{mnemonic:<6}x{rd}, x{rs1}, x{rs2}"),
+    "I": (extract_i, "{mnemonic:<6}x{rd}, x{rs1}, {imm}"),
+    "L": (extract_i, "{mnemonic:<6}x{rd}, {imm}(x{rs1})"),
+    "S": (extract_s, "{mnemonic:<6}x{rs2}, {imm}(x{rs1})"),
+    "B": (extract_b, "{mnemonic:<6}x{rs1}, x{rs2}, {imm}"),
+    "J": (extract_j, "J\t#{target}  //JAL x{rd}, {imm}"),
+    "RET": (extract_i, "RET   //JALR x0, x1, 0"),
+}
+
+# (opcode, funct3, funct7) --> (mnemonic, format). None matches any value of that field.
+# New instructions only need an entry here (and a FORMATS entry if they use a new format)
+INSTRUCTION_TABLE = {
+    (0b0110011, 0b000, 0b0000000): ("ADD", "R"),
+    (0b0110011, 0b000, 0b0100000): ("SUB", "R"),
+    (0b0110011, 0b010, 0b0000000): ("SLT", "R"),
+    (0b0110011, 0b111, 0b0000000): ("AND", "R"),
+    (0b0110011, 0b110, 0b0000000): ("OR", "R"),
+    (0b0110011, 0b100, 0b0000000): ("XOR", "R"),
+    (0b0110011, 0b001, 0b0000000): ("SLL", "R"),
+    (0b0110011, 0b101, 0b0000000): ("SRL", "R"),
+    (0b0000011, None, None): ("LW", "L"),      # only load supported, funct3 isn't checked
+    (0b0100011, None, None): ("SW", "S"),      # only store supported
+    (0b0010011, 0b000, None): ("ADDI", "I"),
+    (0b0010011, 0b010, None): ("SLTI", "I"),
+    (0b1100011, 0b000, None): ("BEQ", "B"),
+    (0b1100011, 0b001, None): ("BNE", "B"),
+    (0b1100011, 0b100, None): ("BLT", "B"),
+    (0b1100011, 0b101, None): ("BGE", "B"),
+    (0b1101111, None, None): ("J", "J"),       # JAL, listed as J
+    (0b1100111, None, None): ("RET", "RET"),   # JALR, anything after it is data
+}
+
+MNEMONIC_FORMAT = {mnemonic: fmt for mnemonic, fmt in INSTRUCTION_TABLE.values()}
+
+
+def dispatch_key(word):
+    # opcode [6-0], funct3 [14-12] and funct7 [31-25] packed into one 17 bit number
+    return (word & 0b1111111) | ((word >> 5) & 0b1110000000) | ((word >> 15) & 0b11111110000000000)
+
+
+def build_dispatch_index():
+    # Expands the wildcards in INSTRUCTION_TABLE so decoding is a single dict lookup on dispatch_key
+    index = {}
+    for (opcode, funct3, funct7), (mnemonic, fmt) in INSTRUCTION_TABLE.items():
+        for f3 in ([funct3] if funct3 is not None else range(8)):
+            for f7 in ([funct7] if funct7 is not None else range(128)):
+                index[opcode | (f3 << 7) | (f7 << 10)] = (mnemonic, FORMATS[fmt][0])
+    return index
+
+
+DISPATCH_INDEX = build_dispatch_index()
+
+
+class DecodedInstruction:
+    # One decoded 32 bit word. Fields are kept as numbers, the listing text is only built by text()
+    # mnemonic --> "ADD", "LW", "J", "RET", ... / "DATA" for words after RET / None when it didn't decode
+    __slots__ = ("word", "address", "mnemonic", "rd", "rs1", "rs2", "imm")
+
+    def __init__(self, word, address, mnemonic, rd=0, rs1=0, rs2=0, imm=0):
+        self.word = word
+        self.address = address
+        self.mnemonic = mnemonic
+        self.rd = rd
+        self.rs1 = rs1
+        self.rs2 = rs2
+        self.imm = imm
+
+    def text(self):
+        # Line of the disassembly listing for this word
+        word = self.word
+        mnemonic = self.mnemonic
+        if mnemonic == "DATA":
+            return f"{word:032b}\t\t{self.address}\t{self.imm}"
+        if mnemonic is None:
+            return f"{word}\t\t{self.address}\t0"
+
+        # First 32 bits of output for an instruction should be split 7, 5, 5, 3, 5, and 7
+        binary_split = f"{(word >> 25) & 0b1111111:07b} {(word >> 20) & 0b11111:05b} {(word >> 12) & 0b111:03b} " \
+                       f"{(word >> 15) & 0b11111:05b} {(word >> 7) & 0b11111:05b} {word & 0b1111111:07b}"
+        asm = FORMATS[MNEMONIC_FORMAT[mnemonic]][1].format(mnemonic=mnemonic, rd=self.rd, rs1=self.rs1, rs2=self.rs2,
+                                                           imm=self.imm, target=self.address + self.imm)
+        return f"{binary_split}\t{self.address}\t{asm}"
+
+# Listing lines buffered per write
+LISTING_CHUNK_LINES = 4096
+
+
 class Disassembler:
 
-    def __init__(self, input_file_name, output_file_name):
+    def __init__(self, input_file_name, output_file_name, bulk=False, input_format="auto"):
         # Class takes in files as inputs
         self.input_file_name = input_file_name
         self.output_file_name = output_file_name 
+        self.bulk = bulk # Decode with NumPy (bulk_decoder) when it's installed
+        self.input_format = input_format # text, bin, hex or auto (from the extension), see input_formats
         self.address = 496 # Starting address of instructions
-        self.result = [] # Stores the disassembled instructions
         self.ret = False # Flag to indicate when I hit RET
 
     # num --> immediate value extracted
     # bits --> number of bits 
     def get_signed(self, num, bits):
-        MSB = 1 << (bits - 1)
-        # num is a binary before, becomes signed integer
-        if num & (MSB): # if number negetive, sign extend with 1s
-            num -= 1 << bits
-        return num
+        return sign_extend(num, bits)
     
     def decode_instruction(self, instruction):
-
-        # Extract the standard risc fields, broken down later if needed for imm
-        opcode = instruction & 0b1111111  # 7 bits opcode. 0-6
-        rd = (instruction >> 7) & 0b11111  # 5 bits rd. 11-7
-        funct3 = (instruction >> 12) & 0b111  # 3 bits funct3. 14-12
-        rs1 = (instruction >> 15) & 0b11111  # 5 bits for rs1. 19-15
-        rs2 = (instruction >> 20) & 0b11111  # 5 bits for rs2. 24-20
-        funct7 = (instruction >> 25) & 0b1111111  # 7 bit funct7. 31-25
-
-        # First 32 bits of output for an instruction should be split 7, 5, 5, 3, 5, and 7
-        binary_split = f"{funct7:07b} {rs2:05b} {funct3:03b} {rs1:05b} {rd:05b} {opcode:07b}"
-
-        # R type op
-        if opcode == 0b0110011:
-            if funct3 == 0b000 and funct7 == 0b0000000:  # ADD
-                # add rd, rs1, rs2
-                return f"{binary_split}\t{self.address}\tADD   x{rd}, x{rs1}, x{rs2}"
-            elif funct3 == 0b000 and funct7 == 0b0100000:  # SUB
-                # sub rd, rs1, rs2
-                return f"{binary_split}\t{self.address}\tSUB   x{rd}, x{rs1}, x{rs2}"
-            elif funct3 == 0b010 and funct7 == 0b0000000:  # SLT 
-                # rd = rs1 < rs2
-                return f"{binary_split}\t{self.address}\tSLT   x{rd}, x{rs1}, x{rs2}"
-            elif funct3 == 0b111 and funct7 == 0b0000000:  #  AND
-                return f"{binary_split}\t{self.address}\tAND   x{rd}, x{rs1}, x{rs2}"
-            elif funct3 == 0b110 and funct7 == 0b0000000:  # OR
-                return f"{binary_split}\t{self.address}\tOR    x{rd}, x{rs1}, x{rs2}"
-            elif funct3 == 0b100 and funct7 == 0b0000000:  #XOR
-                return f"{binary_split}\t{self.address}\tXOR   x{rd}, x{rs1}, x{rs2}"
-            elif funct3 == 0b001 and funct7 == 0b0000000:  #SLL 
-                return f"{binary_split}\t{self.address}\tSLL   x{rd}, x{rs1}, x{rs2}"
-            elif funct3 == 0b101 and funct7 == 0b0000000:  # SRL 
-                return f"{binary_split}\t{self.address}\tSRL   x{rd}, x{rs1}, x{rs2}"
-        # Load (only LW)
-        elif opcode == 0b0000011:
-            # Load is the only L type, so no further checks needed
-            # Extract unsigned immediate in [31-20]
-            imm = (instruction >> 20) & 0b111111111111
-            signed_imm = self.get_signed(imm, 12) # extend to XLEN = 12
-            return f"{binary_split}\t{self.address}\tLW    x{rd}, {signed_imm}(x{rs1})"
-        
-        # Store (only SW)
-        elif opcode == 0b0100011:
-            # Store is only S type
-            # [31-25] and [11-7] are the immediate 
-            imm = ((instruction >> 25) << 5) | (instruction >> 7) & 0b11111
-            signed_imm = self.get_signed(imm, 12)
-            return f"{binary_split}\t{self.address}\tSW    x{rs2}, {signed_imm}(x{rs1})"
-        
-        # I 
-        elif opcode == 0b0010011:
-            # imm same for ADDI and SLTI, [31-20]
-            imm = (instruction >> 20) & 0b111111111111
-            signed_imm = self.get_signed(imm, 12)
-            # ADDI
-            if funct3 == 0b000:
-                return f"{binary_split}\t{self.address}\tADDI  x{rd}, x{rs1}, {signed_imm}"
-            # SLTI
-            elif funct3 == 0b010:
-                return f"{binary_split}\t{self.address}\tSLTI  x{rd}, x{rs1}, {signed_imm}"
-            
-        ### Branch, J, JALR left
-            
-        # Branch
-        elif opcode == 0b1100011:
-            # Extracting immediate
-            # so branch immediate have two MSB in 31 and 7
-            # order --> [31] [7] [30-25] [11-8]
-            imm = ((instruction >> 31) & 0b1) << 12 | ((instruction >> 25) & 0b111111) << 5 |((instruction >> 8) & 0b1111) << 1 | ((instruction >> 7) & 0b1) << 11
-            signed_imm = self.get_signed(imm, 13)
-               # BNE
-            if funct3 == 0b001:
-                return f"{binary_split}\t{self.address}\tBNE   x{rs1}, x{rs2}, {signed_imm}"
-            # BLT
-            elif funct3 == 0b100:
-                return f"{binary_split}\t{self.address}\tBLT   x{rs1}, x{rs2}, {signed_imm}"
-            # BGE
-            elif funct3 == 0b101:
-                return f"{binary_split}\t{self.address}\tBGE   x{rs1}, x{rs2}, {signed_imm}"
-            #BEQ
-            elif funct3 == 0b000:
-                return f"{binary_split}\t{self.address}\tBEQ   x{rs1}, x{rs2}, {signed_imm}"
-            
-        # JAL
-        elif opcode == 0b1101111:
-            # Extracting immediate
-            # order = [31] [19-12] [20] [30-21] (bit position)
-            imm = ((instruction >> 31) & 0b1) << 20 | ((instruction >> 12) & 0b11111111) << 12 | ((instruction >> 20) & 0b1) << 11 | ((instruction >> 21) & 0b1111111111) << 1
-            signed_imm = self.get_signed(imm, 21)    # imm is length 21 on this
-            write_to = self.address + signed_imm
-            return f"{binary_split}\t{self.address}\tJ\t#{write_to}  //JAL x{rd}, {signed_imm}"
-
-        
-        # JALR
-        elif opcode == 0b1100111:
-            # order = [31-20] size = 12
-            imm = (instruction >> 20) & 0b111111111111
-            signed_imm = self.get_signed(imm, 12)
+        # Returns a DecodedInstruction, text() gives the listing line.
+        # One lookup on (opcode, funct3, funct7) picks the mnemonic and the format's field extractor
+        entry = DISPATCH_INDEX.get(dispatch_key(instruction))
+        if entry is None:
+            return DecodedInstruction(instruction, self.address, None)
+        mnemonic, extract = entry
+        rd, rs1, rs2, imm = extract(instruction)
+        if mnemonic == "RET":
             self.ret = True # Hit ret so change bool
-            return f"{binary_split}\t{self.address}\tRET   //JALR x0, x1, 0"
-
-        return f"{instruction}\t\t{self.address}\t0"
+        return DecodedInstruction(instruction, self.address, mnemonic, rd, rs1, rs2, imm)
     
-    def decode_data(self, line):
-        data = int(line, 2)
-        return f"{line}\t\t{self.address}\t{data}"
+    def decode_data(self, data):
+        return DecodedInstruction(data, self.address, "DATA", imm=data)
 
-    # primary logic. breaks down file line by line. Decodes each line and then writes it to result
-    def disassemble(self):
+    # Generator over the input file, yields each DecodedInstruction as soon as its word has been read so the
+    # caller can start on it before the rest of the file is decoded
+    def iter_decode(self):
+        self.address = 496
+        self.ret = False
+
+        if self.bulk:
+            import bulk_decoder  # imported here, bulk_decoder itself imports this module
+            if bulk_decoder.available():
+                yield from self.decode_bulk(bulk_decoder)
+                return
+
+        # words come straight off the file one at a time, see input_formats
+        yield from self.decode_words(read_words(self.input_file_name, self.input_format))
 
-        # Get lines from input file
-        f = open(self.input_file_name, 'r')
-        lines = []
-        for line in f.readlines():
-            lines.append(line.strip())
-        f.close()
-
-        #lines now contains all the lines from the input file
-        # iterate through each line and decode it
-        for line in lines:
-            if len(line) == 0:
-                continue
-            elif len(line) != 32:
-                print("Wrong line length")
-                break
+    # Generator, decodes the given 32 bit words in order from the current address on. iter_decode feeds it the
+    # input file, an in-memory program can be passed straight in (Disassembler(None, None).decode_words(words))
+    def decode_words(self, words):
+        for word in words:
             if not self.ret:
-                #print(line)
-                instruction = self.decode_instruction(int(line,2))
+                instruction = self.decode_instruction(word)
             else:
-                #print(line)
-                instruction = self.decode_data(line)
-            self.result.append(instruction)
+                instruction = self.decode_data(word)
+            yield instruction
             self.address += 4
 
-        # Just open output file and write the lines stored in result list
-        f_out = open(self.output_file_name, 'w')
-        for line in self.result:
-            f_out.write(line +'\n')
-        f_out.close()
\ No newline at end of file
+    # Reads the input file once and decodes every word. Returns the list of DecodedInstruction
+    def decode(self):
+        return list(self.iter_decode())
+
+    # Same result as the loop in decode, but the whole image is decoded at once with NumPy
+    def decode_bulk(self, bulk_decoder):
+        words = bulk_decoder.read_word_array(self.input_file_name, self.input_format)
+        decoded = bulk_decoder.decode_bulk(words, self.address)
+        self.address += 4 * len(decoded)
+        self.ret = any(instruction.mnemonic == "RET" for instruction in decoded)
+        return decoded
+
+    # Passes the records through unchanged while writing their listing lines to the output file. Lines are
+    # written LISTING_CHUNK_LINES at a time, so only one chunk is ever held no matter how big the program is
+    def stream_listing(self, decoded):
+        with open(self.output_file_name, 'w') as f_out:
+            chunk = []
+            for instruction in decoded:
+                chunk.append(instruction.text())
+                if len(chunk) == LISTING_CHUNK_LINES:
+                    f_out.write('\n'.join(chunk) + '\n')
+                    chunk.clear()
+                yield instruction
+            if chunk:
+                f_out.write('\n'.join(chunk) + '\n')
+
+    # Just open output file and write the listing lines for the decoded words. Returns the number of lines
+    def write_listing(self, decoded):
+        count = 0
+        for _ in self.stream_listing(decoded):
+            count += 1
+        return count
+
+    # primary logic. Decodes the input word by word and streams the listing out as it goes
+    def disassemble(self):
+        return self.write_listing(self.iter_decode())
@@ -0,0 +1,118 @@
+# functional_simulator.py
+# Instruction-at-a-time interpreter with no pipeline timing. Works directly on a PipelineSimulator's
+# registers, memory and pc so the detailed model can pick up where it left off
+
+from block_cache import BlockCache
+from memory import to_word
+
+
+class FunctionalSimulator:
+
+    def __init__(self, pipeline_sim, use_blocks=True):
+        self.sim = pipeline_sim
+        self.instructions_executed = 0
+        self.halted = False
+        # Run whole basic blocks as compiled functions (block_cache) instead of one instruction at a time
+        self.block_cache = BlockCache(pipeline_sim.decoded_instructions) if use_blocks else None
+
+    def run(self, max_instructions):
+        # Execute up to max_instructions starting at sim.pc. Stops early when the program halts, same
+        # conditions as the pipeline: a taken branch or running off the end of the program
+        if self.block_cache is None:
+            return self.interpret(max_instructions)
+        sim = self.sim
+        registers = sim.registers
+        memory = sim.memory
+        block_cache = self.block_cache
+        end = block_cache.code_end
+        executed = 0
+
+        while executed < max_instructions:
+            pc = sim.pc
+            if pc >= end:
+                self.halted = True
+                break
+            block = block_cache.lookup(pc) if pc >= 496 and not pc & 3 else None
+            if block is None or block.length > max_instructions - executed:
+                # Odd pc, or the block would overshoot the budget: one instruction in the interpreter
+                executed += self.interpret(1)
+                if self.halted:
+                    break
+                continue
+            sim.pc, count, halted = block.run(registers, memory)
+            executed += count
+            self.instructions_executed += count
+            if halted:
+                self.halted = True
+                break
+        return executed
+
+    def interpret(self, max_instructions):
+        # Plain interpreter, one if/elif dispatch per instruction
+        sim = self.sim
+        registers = sim.registers
+        memory = sim.memory
+        decoded_instructions = sim.decoded_instructions
+        end = 496 + len(decoded_instructions) * 4
+        pc = sim.pc
+        executed = 0
+
+        while executed < max_instructions:
+            if pc >= end:
+                self.halted = True
+                break
+            instruction = decoded_instructions[(pc - 496) // 4]
+            operation = instruction.operation
+            regs = instruction.regs
+            next_pc = pc + 4
+
+            if operation == "NOP":
+                pass
+            elif operation == "ADD":
+                registers[regs[0]] = to_word(registers[regs[1]] + registers[regs[2]])
+            elif operation == "SUB":
+                registers[regs[0]] = to_word(registers[regs[1]] - registers[regs[2]])
+            elif operation == "ADDI":
+                registers[regs[0]] = to_word(registers[regs[1]] + instruction.imm)
+            elif operation == "SLL":
+                registers[regs[0]] = to_word(registers[regs[1]] << registers[regs[2]])
+            elif operation == "SRL":
+                registers[regs[0]] = registers[regs[1]] >> registers[regs[2]]
+            elif operation == "AND":
+                registers[regs[0]] = registers[regs[1]] & registers[regs[2]]
+            elif operation == "OR":
+                registers[regs[0]] = registers[regs[1]] | registers[regs[2]]
+            elif operation == "XOR":
+                registers[regs[0]] = registers[regs[1]] ^ registers[regs[2]]
+            elif operation == "SLT":
+                registers[regs[0]] = 1 if registers[regs[1]] < registers[regs[2]] else 0
+            elif operation == "SLTI":
+                registers[regs[0]] = 1 if registers[regs[1]] < instruction.imm else 0
+            elif operation == "LW":
+                registers[regs[0]] = memory[registers[instruction.base] + instruction.imm]
+            elif operation == "SW":
+                memory[registers[instruction.base] + instruction.imm] = registers[regs[0]]
+            elif operation in ["BEQ", "BNE", "BLT", "BGE"]:
+                src1_value = registers[regs[0]]
+                src2_value = registers[regs[1]]
+                if (operation == "BEQ" and src1_value == src2_value) or \
+                   (operation == "BNE" and src1_value != src2_value) or \
+                   (operation == "BLT" and src1_value < src2_value) or \
+                   (operation == "BGE" and src1_value >= src2_value):
+                    # The pipeline model ends the run on a taken branch
+                    pc += instruction.imm
+                    executed += 1
+                    self.halted = True
+                    break
+            elif operation == "J":
+                next_pc = instruction.imm
+            elif operation == "JAL":
+                registers[regs[0]] = pc + 4
+                next_pc = pc + instruction.imm
+
+            pc = next_pc
+            executed += 1
+
+        sim.pc = pc
+        self.instructions_executed += executed
+        return executed
@@ -0,0 +1,146 @@
+# input_formats.py
+# Readers for the program images the disassembler accepts. Each one is a generator of 32 bit instruction
+# words, in order, so the input is never held in memory as a whole
+#   text --> 32 '0'/'1' characters per line (the original format)
+#   bin  --> raw little-endian image, 4 bytes per word, read through mmap
+#   hex  --> Intel HEX (record types 00, 01, 02, 04; start address records are ignored)
+# The image always starts at address 496, the address fields of a HEX file only decide where the gaps are
+
+import mmap
+import struct
+import sys
+from itertools import repeat
+
+FORMATS = ["text", "bin", "hex"]
+EXTENSIONS = {".bin": "bin", ".img": "bin", ".hex": "hex", ".ihex": "hex", ".ihx": "hex"}
+
+
+def detect_format(file_name):
+    # auto --> pick from the extension, anything unknown is the text format
+    for extension, input_format in EXTENSIONS.items():
+        if file_name.lower().endswith(extension):
+            return input_format
+    return "text"
+
+
+def text_lines(file_name):
+    # The stripped '0'/'1' lines, blank lines skipped. Stops at the first line of the wrong length
+    with open(file_name, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            elif len(line) != 32:
+                print("Wrong line length")
+                break
+            yield line
+
+
+def text_words(file_name):
+    for line in text_lines(file_name):
+        yield int(line, 2)
+
+
+def words_from_text(text):
+    # In-memory version of the text format: a string of '0'/'1' lines. Raises on a bad line instead of stopping
+    words = []
+    for line_number, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if len(line) == 0:
+            continue
+        if len(line) != 32:
+            raise ValueError(f"line {line_number}: wrong line length")
+        words.append(int(line, 2))
+    return words
+
+
+def words_from_bytes(data):
+    # In-memory version of the bin format, little-endian words. A trailing partial word is an error
+    if len(data) % 4:
+        raise ValueError("wrong image length, not a multiple of 4 bytes")
+    return [word for (word,) in struct.iter_unpack('<I', data)]
+
+
+def binary_words(file_name, start=0, end=None):
+    # start, end --> only the words [start, end) of the image, straight from the mapping
+    with open(file_name, 'rb') as file:
+        size = file.seek(0, 2)
+        if size == 0:
+            return
+        if size % 4 and start == 0 and end is None:
+            print("Wrong file length")
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as image:
+            with memoryview(image) as view, view[:size - size % 4] as words:
+                if sys.byteorder == 'little':
+                    # Host order is the image order, so the mapped bytes can be read as words directly
+                    with words.cast('I') as native, native[start:end] as selected:
+                        yield from selected
+                else:
+                    with words[4 * start:None if end is None else 4 * end] as selected:
+                        for (word,) in struct.iter_unpack('<I', selected):
+                            yield word
+
+
+def hex_words(file_name):
+    base = 0             # from the 02/04 extended address records
+    next_address = None  # address of the first byte not yet in pending
+    pending = bytearray()
+    with open(file_name, 'r') as file:
+        for line_number, line in enumerate(file, 1):
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            if line[0] != ':':
+                raise ValueError(f"{file_name}:{line_number}: not an Intel HEX record")
+            record = bytes.fromhex(line[1:])
+            if len(record) < 5 or len(record) != record[0] + 5:
+                raise ValueError(f"{file_name}:{line_number}: bad record length")
+            if sum(record) & 0xFF:
+                raise ValueError(f"{file_name}:{line_number}: checksum mismatch")
+            record_type = record[3]
+            data = record[4:-1]
+
+            if record_type == 0x00:
+                address = base + (record[1] << 8 | record[2])
+                if next_address is None:
+                    next_address = address
+                if address < next_address:
+                    raise ValueError(f"{file_name}:{line_number}: records are not in address order")
+                gap = address - next_address
+                if gap:
+                    # Gaps read as 0. Sections can be far apart, so the gap is never built in memory: the word in
+                    # pending is topped up, whole zero words are yielded one by one, the rest goes into pending
+                    fill = min(gap, -len(pending) % 4)
+                    pending.extend(bytes(fill))
+                    gap -= fill
+                    if len(pending) == 4:
+                        yield int.from_bytes(pending, 'little')
+                        del pending[:]
+                    yield from repeat(0, gap // 4)
+                    pending.extend(bytes(gap % 4))
+                pending.extend(data)
+                next_address = address + len(data)
+                whole = len(pending) - len(pending) % 4
+                for (word,) in struct.iter_unpack('<I', pending[:whole]):
+                    yield word
+                del pending[:whole]
+            elif record_type == 0x01:
+                break
+            elif record_type == 0x02:
+                base = int.from_bytes(data, 'big') << 4
+            elif record_type == 0x04:
+                base = int.from_bytes(data, 'big') << 16
+
+    if pending:
+        # Last word is padded out with zero bytes
+        yield int.from_bytes(pending + bytes(4 - len(pending)), 'little')
+
+
+def read_words(file_name, input_format="auto"):
+    if input_format == "auto":
+        input_format = detect_format(file_name)
+    if input_format == "bin":
+        return binary_words(file_name)
+    if input_format == "hex":
+        return hex_words(file_name)
+    return text_words(file_name)
@@ -1,6 +1,94 @@
 import argparse
+import os
 from pipeline_simulator import PipelineSimulator
 from disassembler import Disassembler
+from input_formats import FORMATS, detect_format
+from parallel_disassembly import disassemble_parallel
+from trace_writer import TraceWriter, AsyncTraceWriter
+from binary_trace import BinaryTraceWriter
+from profiler import Profiler
+from result_cache import ResultCache, DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES
+
+def run_dis(args):
+    disassembler = Disassembler(args.input_file_name, args.output_file_name, args.bulk, args.format)
+    if args.jobs is not None:
+        disassemble_parallel(disassembler, args.jobs)
+    else:
+        disassembler.disassemble()
+
+
+def run_sim(args):
+    if args.T:
+        trace_start, trace_end = map(int, args.T.split(":"))
+    else:
+        trace_start, trace_end = None, None
+
+    if args.from_listing:
+        # Old path, simulate an existing disassembly listing
+        with open(args.output_file_name, 'r') as file:
+            instructions = file.readlines()
+
+        instructions = [instr.strip() for instr in instructions if instr.strip() != '']
+    else:
+        # Decode the binary input straight into the simulator, the listing is just a side output
+        # Records are handed over one at a time as they're decoded (and written to the listing)
+        disassembler = Disassembler(args.input_file_name, args.output_file_name, args.bulk, args.format)
+        instructions = disassembler.iter_decode()
+        if not args.no_listing:
+            instructions = disassembler.stream_listing(instructions)
+
+    if args.async_trace:
+        trace_writer = AsyncTraceWriter(args.output_file_name_2, echo=not args.quiet, flush_interval=args.flush_interval,
+                                        compress=args.gzip, summary_only=args.summary_only,
+                                        use_process=args.async_trace == 'process')
+    else:
+        trace_writer = TraceWriter(args.output_file_name_2, echo=not args.quiet, flush_interval=args.flush_interval,
+                                   compress=args.gzip, summary_only=args.summary_only)
+    binary_trace = BinaryTraceWriter(args.binary_trace) if args.binary_trace else None
+    pipeline_sim = PipelineSimulator(instructions, trace_start, trace_end, args.output_file_name_2, trace_writer,
+                                     binary_trace, args.delta_trace)
+    if args.memory_window:
+        start, end = map(int, args.memory_window.split(":"))
+        pipeline_sim.memory.dump_window = (start, end)
+    if args.restore:
+        pipeline_sim.restore_checkpoint(args.restore)
+    elif args.restore_cycle is not None:
+        pipeline_sim.restore_checkpoint_at(args.checkpoint_dir, args.restore_cycle)
+    if args.checkpoint_every:
+        os.makedirs(args.checkpoint_dir, exist_ok=True)
+        pipeline_sim.checkpoint_interval = args.checkpoint_every
+        pipeline_sim.checkpoint_dir = args.checkpoint_dir
+    profiler = None
+    if args.profile or args.heatmap:
+        profiler = Profiler()
+        profiler.attach(pipeline_sim)
+    pipeline_sim.simulate(args.fast_forward)
+    if args.profile:
+        profiler.write_profile(args.profile)
+    if args.heatmap:
+        profiler.write_heatmap(args.heatmap)
+
+
+def cache_config(args):
+    # Options that change what a run prints or writes. Decoder choice (--bulk, --jobs), the async writer, gzip and
+    # the flush interval don't, so a result is shared between them
+    config = {"format": detect_format(args.input_file_name) if args.format == 'auto' else args.format}
+    if args.oper == 'sim':
+        config.update({"T": args.T, "no_listing": args.no_listing, "from_listing": args.from_listing,
+                       "fast_forward": args.fast_forward, "memory_window": args.memory_window, "quiet": args.quiet,
+                       "summary_only": args.summary_only, "delta_trace": args.delta_trace})
+    return config
+
+
+def cacheable(args):
+    # Not for runs that depend on more than the input file, write other files, or print from a worker process
+    if args.no_cache:
+        return False
+    if args.oper == 'dis':
+        return True
+    return not (args.checkpoint_every or args.restore or args.restore_cycle is not None or args.binary_trace
+                or args.profile or args.heatmap or (args.async_trace == 'process' and not args.quiet))
+
 
 def main():
     # Command line args
@@ -10,29 +98,70 @@ def main():
     parser.add_argument("output_file_name_2", help="output file for simulator")
     parser.add_argument('oper', choices=['dis', 'sim'], help="Operation to perform")
     parser.add_argument('-T', metavar="m:n", type=str, help="Trace mode - start (m) and end (n) cycles")
+    parser.add_argument('--no-listing', action='store_true', help="sim: don't write the disassembly listing")
+    parser.add_argument('--from-listing', action='store_true',
+                        help="sim: simulate the existing listing in outputfilename1 instead of decoding the input")
+    parser.add_argument('--fast-forward', action='store_true',
+                        help="Run the cycles before the -T window on the functional model instead of the pipeline")
+    parser.add_argument('--checkpoint-every', metavar="n", type=int, default=0, help="Save a checkpoint every n cycles")
+    parser.add_argument('--checkpoint-dir', metavar="dir", default="checkpoints", help="Directory for periodic checkpoints")
+    parser.add_argument('--restore', metavar="file", help="Start from a saved checkpoint")
+    parser.add_argument('--restore-cycle', metavar="n", type=int,
+                        help="Start from the latest checkpoint in --checkpoint-dir at or before cycle n")
+    parser.add_argument('--memory-window', metavar="start:end", type=str,
+                        help="Data memory addresses printed in the trace and summary (default 600:640)")
+    parser.add_argument('--quiet', action='store_true', help="Don't echo the trace to stdout")
+    parser.add_argument('--gzip', action='store_true', help="gzip compress the simulator output file")
+    parser.add_argument('--async-trace', nargs='?', const='thread', choices=['thread', 'process'],
+                        help="Format and write the trace on a background thread (default) or process")
+    parser.add_argument('--summary-only', action='store_true', help="Skip the per-cycle trace, only write the final summary")
+    parser.add_argument('--binary-trace', metavar="file", help="Also write a binary trace of the -T window to file")
+    parser.add_argument('--delta-trace', metavar="n", type=int, default=0,
+                        help="Only print what changed since the previous traced cycle, with a full keyframe every n traced cycles")
+    parser.add_argument('--format', choices=['auto'] + FORMATS, default='auto',
+                        help="Input format: text (0/1 lines), bin (raw little-endian) or hex (Intel HEX). auto goes by the extension")
+    parser.add_argument('--jobs', metavar="n", type=int,
+                        help="dis: decode big images on n worker processes (0 = one per CPU)")
+    parser.add_argument('--bulk', action='store_true', help="Decode the input in one vectorized pass (needs NumPy)")
+    parser.add_argument('--profile', metavar="file", help="sim: write a flat profile of the time spent in each stage to file")
+    parser.add_argument('--heatmap', metavar="file", help="sim: write per-PC executions, cycles and stalls to file (CSV)")
+    parser.add_argument('--flush-interval', metavar="n", type=int, default=1000, help="Flush the trace file every n cycles (0 = only at the end)")
+    parser.add_argument('--no-cache', action='store_true', help="Always run, don't look up or store a cached result")
+    parser.add_argument('--cache-dir', metavar="dir", default=DEFAULT_CACHE_DIR, help="Directory of the result cache")
+    parser.add_argument('--cache-size', metavar="MB", type=int, default=DEFAULT_MAX_BYTES >> 20,
+                        help="Size limit of the result cache, least recently used results are dropped past it")
 
     args = parser.parse_args()
+    if args.fast_forward and (args.restore or args.restore_cycle is not None):
+        # A checkpoint is taken mid-pipeline, the functional model can only start from an empty one
+        parser.error("--fast-forward can't be combined with --restore/--restore-cycle")
 
-    if args.oper == 'dis':
-        disassembler = Disassembler(args.input_file_name, args.output_file_name)
-        disassembler.disassemble()
-
-    elif args.oper == 'sim':
-        if args.T:
-            trace_start, trace_end = map(int, args.T.split(":"))
-        else:
-            trace_start, trace_end = None, None
-
-        with open(args.output_file_name, 'r') as file:
-            instructions = file.readlines()
-
-        instructions = [instr.strip() for instr in instructions if instr.strip() != '']
-
-        pipeline_sim = PipelineSimulator(instructions, trace_start, trace_end, args.output_file_name_2)
-        pipeline_sim.simulate()
+    runner = run_dis if args.oper == 'dis' else run_sim
+    if not cacheable(args):
+        runner(args)
+        return
 
+    # dis writes the listing; sim writes it unless told not to and appends to the simulator output file
+    if args.oper == 'dis':
+        listing_file_name, output_file_name = args.output_file_name, None
     else:
-        print("Invalid operation.")
+        listing_file_name = None if args.no_listing or args.from_listing else args.output_file_name
+        output_file_name = args.output_file_name_2
+    input_file_name = args.output_file_name if args.from_listing else args.input_file_name
+    cache = ResultCache(args.cache_dir, args.cache_size << 20)
+    try:
+        key = cache.key(args.oper, input_file_name, cache_config(args))
+    except OSError:
+        # Unreadable input, let the run report it
+        runner(args)
+        return
+    entry = cache.load(key)
+    if entry is not None:
+        cache.replay(entry, listing_file_name, output_file_name, args.gzip)
+        return
+    entry = cache.record(lambda: runner(args), listing_file_name, output_file_name, args.gzip)
+    if entry is not None:
+        cache.store(key, entry)
 
 if __name__ == "__main__":
     main()
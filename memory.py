@@ -0,0 +1,104 @@
+# memory.py
+# Sparse data memory. 4 KiB pages are only allocated the first time something is written to them,
+# reading a page that was never written just gives 0
+
+import base64
+
+PAGE_SIZE = 4096
+PAGE_SHIFT = 12
+WORDS_PER_PAGE = PAGE_SIZE // 4
+
+
+def to_word(value):
+    # Wrap to a signed 32 bit word, what a memory word can actually hold
+    return ((value + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+
+
+class PagedMemory:
+
+    def __init__(self, dump_window=(600, 640)):
+        # dump_window --> [start, end) of the words the trace and summary always print
+        self.pages = {}   # page number -> memoryview of the page's bytearray, as 32 bit words
+        self.dump_window = dump_window
+        self.stored = set()   # addresses written by the program (SW), loaded data doesn't count
+
+    def page(self, address):
+        page_number = address >> PAGE_SHIFT
+        words = self.pages.get(page_number)
+        if words is None:
+            words = memoryview(bytearray(PAGE_SIZE)).cast('i')
+            self.pages[page_number] = words
+        return words
+
+    def __getitem__(self, address):
+        words = self.pages.get(address >> PAGE_SHIFT)
+        if words is None:
+            return 0
+        if address & 3:
+            return self.read_unaligned(address)
+        return words[(address & (PAGE_SIZE - 1)) >> 2]
+
+    def __setitem__(self, address, value):
+        self.stored.add(address)
+        self.write(address, value)
+
+    def write(self, address, value):
+        # Store without marking the address as written by the program
+        if address & 3:
+            self.write_unaligned(address, value)
+            return
+        self.page(address)[(address & (PAGE_SIZE - 1)) >> 2] = to_word(value)
+
+    def get(self, address, default=0):
+        # Like dict.get: default for a page that was never allocated
+        if address >> PAGE_SHIFT not in self.pages:
+            return default
+        return self[address]
+
+    def read_unaligned(self, address):
+        data = bytes(self.read_byte(address + i) for i in range(4))
+        return int.from_bytes(data, 'little', signed=True)
+
+    def write_unaligned(self, address, value):
+        for i, byte in enumerate(to_word(value).to_bytes(4, 'little', signed=True)):
+            self.page(address + i).obj[(address + i) & (PAGE_SIZE - 1)] = byte
+
+    def read_byte(self, address):
+        words = self.pages.get(address >> PAGE_SHIFT)
+        return 0 if words is None else words.obj[address & (PAGE_SIZE - 1)]
+
+    def load_words(self, words):
+        # words --> iterable of (address, value), e.g. the data section after RET
+        for address, value in words:
+            self.write(address, value)
+
+    def touched_words(self):
+        # (address, value) for every word of every allocated page, in address order
+        for page_number in sorted(self.pages):
+            base = page_number << PAGE_SHIFT
+            for i, value in enumerate(self.pages[page_number]):
+                yield base + 4 * i, value
+
+    def window_words(self):
+        start, end = self.dump_window
+        return [(address, self[address]) for address in range(start, end, 4)]
+
+    def words_outside_window(self):
+        # Nonzero words the program stored outside the fixed dump window
+        start, end = self.dump_window
+        words = [(address, self[address]) for address in sorted(self.stored) if not start <= address < end]
+        return [(address, value) for address, value in words if value]
+
+    def clear(self):
+        self.pages.clear()
+        self.stored.clear()
+
+    def snapshot(self):
+        # [(page number, base64 of page bytes)] for checkpoints
+        return [(page_number, base64.b64encode(words.obj).decode()) for page_number, words in sorted(self.pages.items())]
+
+    def restore(self, snapshot, stored=()):
+        self.pages.clear()
+        for page_number, data in snapshot:
+            self.pages[page_number] = memoryview(bytearray(base64.b64decode(data))).cast('i')
+        self.stored = set(stored)
@@ -0,0 +1,105 @@
+# parallel_disassembly.py
+# Disassembly of big images on a process pool. Every word decodes on its own, the only thing that isn't
+# local is where the code ends (first RET), so that's found first with a cheap scan and then the image is cut
+# into address ranges that workers decode independently. The listing is written back in address order.
+
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from disassembler import Disassembler, DISPATCH_INDEX, dispatch_key, LISTING_CHUNK_LINES
+from input_formats import detect_format, read_words, binary_words
+
+# Below this many words a process pool costs more than it saves
+MIN_PARALLEL_WORDS = 1 << 16
+# Shards per worker, a few so a slow shard doesn't hold up the whole merge
+SHARDS_PER_JOB = 4
+
+RET_KEYS = frozenset(key for key, (mnemonic, _) in DISPATCH_INDEX.items() if mnemonic == "RET")
+
+
+def find_code_end(words):
+    # Scans up to the first RET. Returns (index just past it, True), or (number of words, False) if there's none.
+    # Everything from that index on is data
+    count = 0
+    for word in words:
+        count += 1
+        if dispatch_key(word) in RET_KEYS:
+            return count, True
+    return count, False
+
+
+def decode_shard(task):
+    # task --> (source, start, end, code_end). Returns the listing lines for words [start, end).
+    # source --> ("bin", file name) to map the image in the worker, or ("words", array) with the shard's words
+    source, start, end, code_end = task
+    kind, value = source
+    words = binary_words(value, start, end) if kind == "bin" else value
+    disassembler = Disassembler(None, None)
+    disassembler.address = 496 + 4 * start
+    lines = []
+    for i, word in enumerate(words, start):
+        if i < code_end:
+            instruction = disassembler.decode_instruction(word)
+        else:
+            instruction = disassembler.decode_data(word)
+        lines.append(instruction.text())
+        disassembler.address += 4
+    return lines
+
+
+def shard_tasks(words, word_count, code_end, shard_size, file_name=None):
+    # With file_name (raw binary images) the workers read their range straight out of the file, otherwise the
+    # shard's words are sent along
+    for start in range(0, word_count, shard_size):
+        end = min(start + shard_size, word_count)
+        source = ("bin", file_name) if file_name is not None else ("words", words[start:end])
+        yield source, start, end, code_end
+
+
+def disassemble_parallel(disassembler, jobs=None):
+    # Writes the same listing as disassembler.disassemble(), decoding on jobs worker processes.
+    # Returns the number of lines written
+    file_name = disassembler.input_file_name
+    input_format = disassembler.input_format
+    if input_format == "auto":
+        input_format = detect_format(file_name)
+    if input_format == "bin":
+        # Raw images are never loaded here, only scanned up to the RET
+        words = None
+        size = os.path.getsize(file_name)
+        word_count = size // 4
+        if word_count < MIN_PARALLEL_WORDS:
+            return disassembler.disassemble()
+        if size % 4:
+            print("Wrong file length")
+        code_end, found_ret = find_code_end(binary_words(file_name, 0, word_count))
+    else:
+        words = array('I', read_words(file_name, input_format))
+        word_count = len(words)
+        code_end, found_ret = find_code_end(words)
+
+    with open(disassembler.output_file_name, 'w') as f_out:
+        if word_count < MIN_PARALLEL_WORDS:
+            # Small text/hex image, it's already read so just decode it here
+            chunks = [decode_shard((("words", words), 0, word_count, code_end))]
+            pool = None
+        else:
+            jobs = jobs or os.cpu_count() or 1
+            shard_size = max(-(-word_count // (jobs * SHARDS_PER_JOB)), LISTING_CHUNK_LINES)
+            tasks = shard_tasks(words, word_count, code_end, shard_size, file_name if words is None else None)
+            pool = ProcessPoolExecutor(max_workers=jobs)
+            # map hands the shards back in order
+            chunks = pool.map(decode_shard, tasks)
+        count = 0
+        try:
+            for lines in chunks:
+                if lines:
+                    f_out.write('\n'.join(lines) + '\n')
+                count += len(lines)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+    disassembler.address = 496 + 4 * word_count
+    disassembler.ret = found_ret
+    return count
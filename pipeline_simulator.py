@@ -1,31 +1,65 @@
-import re
+import math
+
+from pipeline_state import (Instruction, Pipeline, PipelineRegisters, Scoreboard, new_register_file,
+                            INITIAL_NOP, FETCH_NOP, DATA_NOP, STALL, IS_STALL)
+from trace_writer import TraceWriter, CycleRecord
+from functional_simulator import FunctionalSimulator
+from memory import PagedMemory, to_word
+from checkpoint import save_checkpoint, load_checkpoint, find_checkpoint, checkpoint_file_name
+
+# Cycles from a producer entering RF until a consumer can pick up its result
+LOAD_LATENCY = 3
+ALU_LATENCY = 1
+
 
 class PipelineSimulator:
-    def __init__(self, instructions, trace_start=None, trace_end=None, output_file_name_2=None):
-        # Input list of decoded instructions from disassembler
-        self.instructions = self.convert_instructions(instructions)
+    def __init__(self, instructions, trace_start=None, trace_end=None, output_file_name_2=None, trace_writer=None,
+                 binary_trace=None, delta_trace_interval=0, decoded=None):
+        # Input is either DecodedInstruction records (a list from Disassembler.decode() or the iter_decode()
+        # generator, consumed as it goes), or the lines of a disassembly listing which get parsed as text.
+        # Decode every instruction once up front, IF just indexes into this table by (pc - 496) // 4.
+        # decoded --> (decoded_instructions, data_section) from another simulator's decoded_program(), skips decoding
+        #             (instructions isn't looked at then, None is fine)
+        if decoded is not None:
+            self.instructions = instructions
+            self.decoded_instructions, self.data_section = decoded
+        elif isinstance(instructions, (list, tuple)) and instructions and isinstance(instructions[0], str):
+            self.instructions = self.convert_instructions(instructions)
+            self.decoded_instructions = self.decode_program(self.instructions)
+        else:
+            self.instructions = instructions
+            self.decoded_instructions = self.decode_records(instructions)
         self.output_file_name_2 = output_file_name_2
-        # initialize pipeline as a dictionary with stages as keys
-        nop_instruction = {"operation": "NOP", "operands": [], "address": None, "string": "NOP"}
-        self.pipeline = {
-            "IF": nop_instruction,
-            "IS": nop_instruction,
-            "ID": nop_instruction,
-            "RF": nop_instruction,
-            "EX": nop_instruction,
-            "DF": nop_instruction,
-            "DS": nop_instruction,
-            "WB": nop_instruction
-        }
+        # Trace/summary sink, by default append to output_file_name_2 and echo to stdout
+        self.trace_writer = trace_writer if trace_writer is not None else TraceWriter(output_file_name_2)
+        # Optional BinaryTraceWriter, gets a record for every cycle inside the trace window
+        self.binary_trace = binary_trace
+        # 0 prints the full state every traced cycle, n > 0 prints a full keyframe every n traced cycles and
+        # only the changes in between
+        self.delta_trace_interval = delta_trace_interval
+        self.traced_cycles = 0
+        self.previous_trace_state = None
+        # Periodic checkpoints, every checkpoint_interval cycles into checkpoint_dir (0 = off)
+        self.checkpoint_interval = 0
+        self.checkpoint_dir = None
+        # Called with each section's name as advance_pipeline finishes it, set by an attached profiler
+        self.section_timer = None
+        # initialize pipeline with every stage holding a NOP
+        self.pipeline = Pipeline(INITIAL_NOP)
         self.clock_cycle = 0              
         self.trace_start = trace_start    
         self.trace_end = trace_end        
 
-        self.registers = {f"R{i}": 0 for i in range(32)}  # 32 registers as a dictionary
-        self.memory = {i: 0 for i in range(600, 640, 4)}    # Dictionary to represent memory space from address 600 to 636
+        self.registers = new_register_file()  # R0..R31, indexed by register number
+        self.memory = PagedMemory()    # Sparse paged data memory, trace/summary print the 600..636 window
+        self.memory.load_words(self.data_section)
 
+        # Running totals, kept up to date as the events happen so summary() and live_stats() never rescan
         self.total_stalls = 0
         self.total_forwardings = 0
+        self.retired = 0          # instructions that left WB (NOPs and bubbles not counted)
+        self.in_flight = 0        # stages holding an instruction whose operation isn't NOP
+        self.forwardings_printed = 0  # total_forwardings when forwarding_print was last cleared
         self.load_stalls = 0
         self.branch_stalls = 0
         self.other_stalls = 0
@@ -47,32 +81,84 @@ class PipelineSimulator:
         }
 
 
-        # instruction_needing_forwarding -> list( possible forwarding_sources)
-        self.forwarding_detected = {}
+        # Register number -> in-flight producers of it, filled as instructions enter RF
+        self.scoreboard = Scoreboard()
+        # Instruction in flight that needs forwarding -> the producers found in ID, youngest first.
+        # Keyed by the instruction object (one per address), not its text
+        self.hazards = {}
         
-        self.pipeline_registers = {
-            "IF/IS": {"NPC": 0},
-            "IS/ID": {"IR": nop_instruction},
-            "RF/EX": {"A": 0, "B": 0},
-            "EX/DF": {"ALUout": 0, "B": 0},
-            "DF/DS": {"ALUout_LMD": 0, "ALUout_LMD_B": 0},
-            "DS/WB": {"ALUout_LMD": 0}
-        }
+        self.pipeline_registers = PipelineRegisters(INITIAL_NOP)
         
         self.is_pipeline_complete = False
 
         self.pc = 496
         self.stall_counter = 0
         self.stall_flag = False
-
-    def simulate(self):
-        # Main loop of stuff
-        for i in range(self.trace_end):
+        self.stored_word = None  # (address, value) written by SW this cycle, if any
+
+    def simulate(self, fast_forward=False):
+        # fast_forward --> run everything before trace_start on the functional model, detailed pipeline after that.
+        # Runs up to trace_end (or until the program halts when there is no trace_end), then writes the summary
+        try:
+            self.run(self.trace_end, fast_forward)
+            self.print_final_summary()
+        finally:
+            self.trace_writer.close()
+            if self.binary_trace is not None:
+                self.binary_trace.close()
+
+    def run(self, end=None, fast_forward=False):
+        # Main loop of stuff. Stops when the pipeline is done or at cycle end (None = no cycle limit).
+        # Doesn't write the summary or close the trace, so it can be called again to keep going.
+        # Returns True if the program halted
+        if fast_forward and self.trace_start and self.clock_cycle < self.trace_start:
+            self.fast_forward(self.trace_start - self.clock_cycle)
+        end = math.inf if end is None else end
+        while self.clock_cycle < end:
             if self.is_pipeline_complete:
                 break
             self.advance_pipeline()
             self.clock_cycle += 1
-        self.print_final_summary()
+            if self.checkpoint_interval and self.clock_cycle % self.checkpoint_interval == 0:
+                self.save_checkpoint(checkpoint_file_name(self.checkpoint_dir, self.clock_cycle))
+        return self.is_pipeline_complete
+
+    def save_checkpoint(self, file_name):
+        save_checkpoint(self, file_name)
+
+    def restore_checkpoint(self, file_name):
+        # Continue from a checkpoint taken by a simulator running the same program
+        load_checkpoint(self, file_name)
+
+    def restore_checkpoint_at(self, checkpoint_dir, cycle):
+        # Continue from the latest periodic checkpoint at or before cycle
+        file_name = find_checkpoint(checkpoint_dir, cycle)
+        if file_name is None:
+            raise FileNotFoundError(f"no checkpoint at or before cycle {cycle} in {checkpoint_dir}")
+        load_checkpoint(self, file_name)
+        return file_name
+
+    def fast_forward(self, cycles):
+        # Execute the next `cycles` instructions on the functional model, counting one cycle each (no stalls or
+        # forwarding are counted), then restart the pipeline empty at the following pc so the detailed model
+        # continues from the same registers and memory. Only from an empty pipeline (the start of a run): the
+        # functional model starts at the fetch pc, instructions already in IS..WB would be lost
+        if self.in_flight:
+            raise ValueError(f"can't fast-forward with {self.in_flight} instructions in the pipeline (cycle {self.clock_cycle})")
+        functional = FunctionalSimulator(self)
+        executed = functional.run(cycles)
+        self.clock_cycle += executed
+        self.retired += executed
+        self.pipeline = Pipeline(INITIAL_NOP)
+        self.in_flight = 0
+        self.pipeline_registers = PipelineRegisters(INITIAL_NOP)
+        self.scoreboard = Scoreboard()
+        self.hazards = {}
+        self.stall_counter = 0
+        self.stall_flag = False
+        if functional.halted:
+            self.is_pipeline_complete = True
+        return executed
 
     def convert_instructions(self, instruction_lines):
         formatted_instructions = []
@@ -83,12 +169,70 @@ class PipelineSimulator:
             formatted_instructions.append(formatted_line)
         
         return formatted_instructions
+
+    def decoded_program(self):
+        # Decoded form of the program, can be handed to other simulators (also across processes) via decoded=
+        return (self.decoded_instructions, self.data_section)
+
+    def decode_records(self, records):
+        # Same as decode_program but straight from the disassembler's DecodedInstruction records, no text involved
+        decoded = []
+        self.data_section = []
+        for record in records:
+            decoded.append(self.convert_record(record))
+            if record.mnemonic == "DATA":
+                self.data_section.append((record.address, record.imm))
+        return tuple(decoded)
+
+    def convert_record(self, record):
+        # Builds the same Instruction parse_instruction gives for the record's listing line
+        mnemonic = record.mnemonic
+        address = record.address
+        rd, rs1, rs2, imm = record.rd, record.rs1, record.rs2, record.imm
+        if mnemonic is None or mnemonic == "DATA":
+            return DATA_NOP
+        if mnemonic == "RET":
+            return Instruction("BREAK", "NOP", [None, None, None], address)
+        if mnemonic == "J":
+            target = address + imm
+            return Instruction(f"J #{target}", "J", [str(target)], address, target)
+        if mnemonic == "ADDI" and rd == 0 and rs1 == 0 and imm == 0:
+            return Instruction("NOP", "NOP", [None, None, None], address)
+        if mnemonic in ["ADDI", "SLTI"]:
+            return Instruction(f"{mnemonic} x{rd}, x{rs1}, {imm} ", mnemonic, [f"R{rd}", f"R{rs1}", str(imm)], address, imm)
+        if mnemonic == "LW":
+            return Instruction(f"LW x{rd}, {imm}(x{rs1}) ", mnemonic, [f"R{rd}", f"{imm}(R{rs1})"], address, imm, rs1)
+        if mnemonic == "SW":
+            return Instruction(f"SW x{rs2}, {imm}(x{rs1}) ", mnemonic, [f"R{rs2}", f"{imm}(R{rs1})"], address, imm, rs1)
+        if mnemonic in ["BEQ", "BNE", "BLT", "BGE"]:
+            return Instruction(f"{mnemonic} x{rs1}, x{rs2}, {imm} ", mnemonic, [f"R{rs1}", f"R{rs2}", str(imm)], address, imm)
+        # R type
+        return Instruction(f"{mnemonic} x{rd}, x{rs1}, x{rs2} ", mnemonic, [f"R{rd}", f"R{rs1}", f"R{rs2}"], address)
+
+    def decode_program(self, instruction_lines):
+        # One time decode pass. Entry i holds the parsed instruction at address 496 + 4 * i.
+        # Stored as a tuple so the table can't be changed once simulation starts.
+        # The "binary address value" lines after RET are the data section, they're kept in self.data_section
+        # as (address, value) and loaded into memory
+        decoded = []
+        self.data_section = []
+        after_ret = False
+        for line in instruction_lines:
+            instruction = self.parse_instruction(line)
+            if after_ret:
+                parts = line.split()
+                if len(parts) == 3:
+                    self.data_section.append((int(parts[1]), int(parts[2])))
+            elif instruction.string == "BREAK":
+                after_ret = True
+            decoded.append(instruction)
+        return tuple(decoded)
     
     def parse_instruction(self, instruction):
-        # Parse the given instruction string and return a dictionary of components
+        # Parse the given instruction string and return its Instruction record
         parts = instruction.split()
         if len(parts) < 4:
-            return {"operation": "NOP", "operands": [None, None, None], "address": None, "string": "NOP"}
+            return DATA_NOP
         asm_str = ""
         for i in range(7, len(parts)):
             asm_str += parts[i] + " "
@@ -98,41 +242,44 @@ class PipelineSimulator:
         operation = parts[7]  # Operation nam
         #Special Case: J 
         if operation == "J":
-            parsed_instr = {
-                "string": parts[7] + " " + parts[8],
-                "operation": operation,
-                "operands": [parts[8][1:len(parts[8])]],
-                "address": address
-            }
-            return parsed_instr
+            target = parts[8][1:len(parts[8])]
+            return Instruction(parts[7] + " " + parts[8], operation, [target], address, int(target))
         if asm_str == "ADDI x0, x0, 0 ":
-            parsed_instr = {
-                "string": "NOP",
-                "operation": "NOP",
-                "operands": [None, None, None],
-                "address": address
-            }
-            return parsed_instr
+            return Instruction("NOP", "NOP", [None, None, None], address)
         if operation == "RET":
-            parsed_instr = {
-                "string": "BREAK",
-                "operation": "NOP",
-                "operands": [None, None, None],
-                "address": address
-            }
-            return parsed_instr
+            return Instruction("BREAK", "NOP", [None, None, None], address)
 
         operands = [op.replace('x', 'R').replace(',', '') for op in parts[8:]]  # swap 'x' with 'R' and remove commas
 
-        parsed_instr = {
-            "string": asm_str,
-            "operation": operation,
-            "operands": operands,
-            "address": address
-        }
-        return parsed_instr
+        # Immediate operand, if any, converted once here instead of every time it's executed
+        imm = None
+        if operation in ["ADDI", "SLTI", "BEQ", "BNE", "BLT", "BGE"]:
+            imm = int(operands[2])
+        elif operation in ["JAL", "JALR"]:
+            imm = int(operands[1])
+
+        # LW/SW address operand is offset(base), split it here so the stages never look at the text
+        base = None
+        if operation in ["LW", "SW"]:
+            offset, _, base_reg = operands[1].rstrip(')').partition('(')
+            imm = int(offset)
+            base = int(base_reg[1:])
+
+        return Instruction(asm_str, operation, operands, address, imm, base)
 
     def advance_pipeline(self):
+        # One clock cycle: every stage runs in the order below, WB first so a stage always sees the latches
+        # the stage in front of it wrote last cycle. timer is the profiler's clock (profiler.py), called at the end
+        # of each section with its name. None unless a profiler is attached
+        timer = self.section_timer
+        pipeline = self.pipeline
+        latches = self.pipeline_registers
+        registers = self.registers
+        scoreboard = self.scoreboard
+        hazards = self.hazards
+
+        # Stall accounting, then every instruction moves one stage down
+        self.stored_word = None
 
         if self.stall_counter > 0:
             self.stall_counter -= 1
@@ -142,164 +289,185 @@ class PipelineSimulator:
         elif self.stall_counter == 0:
             self.stall_flag = False
 
-        self.pipeline["WB"] = self.pipeline["DS"]
-        self.pipeline["DS"] = self.pipeline["DF"]
-        self.pipeline["DF"] = self.pipeline["EX"]
-        self.pipeline["EX"] = self.pipeline["RF"]
+        if pipeline.WB.operation != "NOP":
+            self.in_flight -= 1
+        pipeline.WB = pipeline.DS
+        pipeline.DS = pipeline.DF
+        pipeline.DF = pipeline.EX
+        pipeline.EX = pipeline.RF
         if not self.stall_flag:
-            self.pipeline["RF"] = self.pipeline["ID"]
-            self.pipeline["ID"] = self.pipeline["IS"]
-            self.pipeline["IS"] = self.pipeline["IF"]
-            self.pipeline["IF"] = {"operation": "NOP", "operands": [], "address": None}  # Reset IF stage to NOP
+            pipeline.RF = pipeline.ID
+            pipeline.ID = pipeline.IS
+            pipeline.IS = pipeline.IF
+            pipeline.IF = FETCH_NOP  # Reset IF stage to NOP
         else:
-            self.pipeline["RF"] = {"operation": "NOP", "operands": [None, None, None], "address": None, "string": "** STALL **"}
-            
-
+            pipeline.RF = STALL
+        if timer is not None:
+            timer("shift")
 
         # Write Back to registers
-        if self.pipeline["WB"]["operation"] != "NOP":
-            instruction = self.pipeline["WB"]
-            if instruction["operation"] in ["ADD", "SUB", "ADDI", "SLL", "SRL", "AND", "OR", "XOR", "SLT", "SLTI"]:
-                dest_reg = instruction["operands"][0]
-                result = self.pipeline_registers["DS/WB"]["ALUout_LMD"]
-                self.registers[dest_reg] = result
-            elif instruction["operation"] in ["LW"]:
-                dest_reg = instruction["operands"][0]
-                result = self.pipeline_registers["DS/WB"]["ALUout_LMD"]
-                self.registers[dest_reg] = result
-                if self.pipeline["DS"]["string"] == "** STALL **" and self.pipeline["EX"]["operands"][2] == dest_reg:
-                    self.pipeline_registers["RF/EX"]["B"] = result
+        if pipeline.WB.operation != "NOP":
+            instruction = pipeline.WB
+            self.retired += 1
+            if instruction.operation in ["ADD", "SUB", "ADDI", "SLL", "SRL", "AND", "OR", "XOR", "SLT", "SLTI"]:
+                dest_reg = instruction.regs[0]
+                result = latches.ds_wb_aluout_lmd
+                registers[dest_reg] = result
+            elif instruction.operation in ["LW"]:
+                dest_reg = instruction.regs[0]
+                result = latches.ds_wb_aluout_lmd
+                registers[dest_reg] = result
+                if pipeline.DS.string == "** STALL **" and pipeline.EX.regs[2] == dest_reg:
+                    latches.rf_ex_b = result
                     self.forwarding_counts["DS/WB -> RF/EX"] += 1
-                    self.forwarding_print["DS/WB -> RF/EX"] = f"({instruction['string']}) to ({self.pipeline['EX']['string']})"
-            elif instruction["operation"] == "J":
-                self.pipeline_registers["DS/WB"]["ALUout_LMD"] = 0
+                    self.total_forwardings += 1
+                    self.forwarding_print["DS/WB -> RF/EX"] = f"({instruction.string}) to ({pipeline.EX.string})"
+            elif instruction.operation == "J":
+                latches.ds_wb_aluout_lmd = 0
+        if timer is not None:
+            timer("WB")
 
         # DS Stage
-        if self.pipeline["DS"]["operation"] != "NOP":
-            instruction = self.pipeline["DS"]
-            operation = instruction["operation"]
+        if pipeline.DS.operation != "NOP":
+            instruction = pipeline.DS
+            operation = instruction.operation
 
-            if instruction["string"] in self.forwarding_detected:
-                del self.forwarding_detected[instruction["string"]]
+            if instruction in hazards:
+                del hazards[instruction]
 
             if operation in ["ADD", "SUB", "ADDI", "SLL", "SRL", "AND", "OR", "XOR", "SLT", "SLTI"]:
-                self.pipeline_registers["DS/WB"]["ALUout_LMD"] = self.pipeline_registers["DF/DS"]["ALUout_LMD"]
+                latches.ds_wb_aluout_lmd = latches.df_ds_aluout_lmd
             elif operation in ["SW"]:
                 # need to store the value currently in the 
-                address = self.pipeline_registers["DF/DS"]["ALUout_LMD"]
-                value = self.pipeline_registers["DF/DS"]["ALUout_LMD_B"]
+                address = latches.df_ds_aluout_lmd
+                value = latches.df_ds_aluout_lmd_b
                 self.memory[address] = value
-                self.pipeline_registers["DS/WB"]["ALUout_LMD"] = address
+                self.stored_word = (address, value)
+                latches.ds_wb_aluout_lmd = address
 
             elif operation in ["LW"]:
-                address = self.pipeline_registers["DF/DS"]["ALUout_LMD"]
-                self.pipeline_registers["DS/WB"]["ALUout_LMD"] = self.memory[address]
+                address = latches.df_ds_aluout_lmd
+                latches.ds_wb_aluout_lmd = self.memory[address]
             elif operation in ["BEQ", "BNE", "BLT", "BGE", "JAL", "JALR"]:
-                self.pipeline_registers["DS/WB"]["ALUout_LMD"] = self.pipeline_registers["DF/DS"]["ALUout_LMD"]
+                latches.ds_wb_aluout_lmd = latches.df_ds_aluout_lmd
 
             if operation == "J":
-                self.pipeline_registers["DS/WB"]["ALUout_LMD"] = instruction["operands"][0]
+                latches.ds_wb_aluout_lmd = instruction.imm
+        if timer is not None:
+            timer("DS")
 
         # DF Stage
-        if self.pipeline["DF"]["operation"] != "NOP":
-            instruction = self.pipeline["DF"]
-            operation = instruction["operation"]
+        if pipeline.DF.operation != "NOP":
+            instruction = pipeline.DF
+            operation = instruction.operation
 
             if operation == "LW":
-                address = self.pipeline_registers["EX/DF"]["ALUout"]
-                self.pipeline_registers["DF/DS"]["ALUout_LMD"] = address
+                address = latches.ex_df_aluout
+                latches.df_ds_aluout_lmd = address
 
             elif operation == "SW":
                 #Check to see if forwarding is needed
-                if (instruction["string"] in self.forwarding_detected) and (instruction["operands"][0] == self.pipeline["DS"]["operands"][0]):
+                if (instruction.regs[0] == pipeline.DS.regs[0]) and (pipeline.DS in hazards.get(instruction, ())):
                         self.forwarding_counts["DF/DS -> EX/DF"] += 1
-                        address = self.pipeline_registers["EX/DF"]["ALUout"]
-                        self.pipeline_registers["DF/DS"]["ALUout_LMD"] = address
-                        self.pipeline_registers["DF/DS"]["ALUout_LMD_B"] = self.pipeline_registers["DS/WB"]["ALUout_LMD"]
-                        src_string = self.forwarding_detected[instruction["string"]][0]
-                        self.forwarding_print["DF/DS -> EX/DF"] = f"({src_string}) to ({instruction['string']})"
+                        self.total_forwardings += 1
+                        address = latches.ex_df_aluout
+                        latches.df_ds_aluout_lmd = address
+                        latches.df_ds_aluout_lmd_b = latches.ds_wb_aluout_lmd
+                        src_string = pipeline.DS.string
+                        self.forwarding_print["DF/DS -> EX/DF"] = f"({src_string}) to ({instruction.string})"
                         
                 else:
-                    address = self.pipeline_registers["EX/DF"]["ALUout"]
-                    self.pipeline_registers["DF/DS"]["ALUout_LMD"] = address
-                    value = self.registers[instruction["operands"][0]]
-                    self.pipeline_registers["DF/DS"]["ALUout_LMD_B"] = value
+                    address = latches.ex_df_aluout
+                    latches.df_ds_aluout_lmd = address
+                    value = registers[instruction.regs[0]]
+                    latches.df_ds_aluout_lmd_b = value
 
             elif operation in ["ADD", "SUB", "ADDI", "SLL", "SRL", "AND", "OR", "XOR", "SLT", "SLTI"]:
-                self.pipeline_registers["DF/DS"]["ALUout_LMD"] = self.pipeline_registers["EX/DF"]["ALUout"]
+                latches.df_ds_aluout_lmd = latches.ex_df_aluout
 
             elif operation in ["BEQ", "BNE", "BLT", "BGE", "JAL", "JALR"]:
-                self.pipeline_registers["DF/DS"]["ALUout_LMD"] = self.pipeline_registers["EX/DF"]["ALUout"]
+                latches.df_ds_aluout_lmd = latches.ex_df_aluout
 
             elif operation == "J":
-                self.pc = self.pipeline_registers["EX/DF"]["ALUout"]
-                self.pipeline_registers["DF/DS"]["ALUout_LMD"] = 0
-                self.pipeline_registers["DF/DS"]["ALUout_LMD_B"] = 0
-                self.pipeline_registers["EX/DF"]["ALUout"] = 0
-                self.pipeline_registers["EX/DF"]["B"] = 0
-                self.pipeline_registers["RF/EX"]["A"] = 0
-                self.pipeline_registers["RF/EX"]["B"] = 0
-                self.pipeline["IS"] = {"operation": "NOP", "operands": [], "address": None, "string": "** STALL **"}
-                self.pipeline["ID"] = {"operation": "NOP", "operands": [None, None, None], "address": None, "string": "** STALL **"}
-                self.pipeline["RF"] = {"operation": "NOP", "operands": [None, None, None], "address": None, "string": "** STALL **"}
-                self.pipeline["EX"] = {"operation": "NOP", "operands": [None, None, None], "address": None, "string": "** STALL **"}
-                self.pipeline_registers["IF/IS"]["NPC"] = self.pc + 4
+                self.pc = latches.ex_df_aluout
+                latches.df_ds_aluout_lmd = 0
+                latches.df_ds_aluout_lmd_b = 0
+                latches.ex_df_aluout = 0
+                latches.ex_df_b = 0
+                latches.rf_ex_a = 0
+                latches.rf_ex_b = 0
+                for flushed in (pipeline.IS, pipeline.ID, pipeline.RF, pipeline.EX):
+                    hazards.pop(flushed, None)
+                    if flushed.operation != "NOP":
+                        self.in_flight -= 1
+                pipeline.IS = IS_STALL
+                pipeline.ID = STALL
+                pipeline.RF = STALL
+                pipeline.EX = STALL
+                scoreboard.squash(self.clock_cycle, 1)  # whatever was in RF/EX is gone
+                latches.if_is_npc = self.pc + 4
                 self.branch_stalls += 4
-
+                self.total_stalls += 4
+        if timer is not None:
+            timer("DF")
 
         # EX Stage - Execute ALU operations
-        if self.pipeline["EX"]["operation"] != "NOP":
-            instruction = self.pipeline["EX"]
-            operation = instruction["operation"]
-            operands = instruction["operands"]
+        if pipeline.EX.operation != "NOP":
+            instruction = pipeline.EX
+            operation = instruction.operation
+            regs = instruction.regs
 
             if operation in ["ADD", "SUB", "ADDI", "SLL", "SRL", "AND", "OR", "XOR", "SLT", "SLTI"]:
                 if "I" in operation:
-                    if (instruction["string"] in self.forwarding_detected) and (operands[1] == self.pipeline["DF"]["operands"][0]):
+                    if (regs[1] == pipeline.DF.regs[0]) and (pipeline.DF in hazards.get(instruction, ())):
                         self.forwarding_counts["EX/DF -> RF/EX"] += 1
-                        src1_value = self.pipeline_registers["DF/DS"]["ALUout_LMD"]
-                        src2_value = self.pipeline_registers["RF/EX"]["B"]
-                        src_string = self.forwarding_detected[instruction["string"]][0]
-                        self.forwarding_print["EX/DF -> RF/EX"] = f"({src_string}) to ({instruction['string']})"
-                        del self.forwarding_detected[instruction["string"]]
-                    elif (instruction["string"] in self.forwarding_detected) and (operands[1] == self.pipeline["WB"]["operands"][0]):
+                        self.total_forwardings += 1
+                        src1_value = latches.df_ds_aluout_lmd
+                        src2_value = latches.rf_ex_b
+                        src_string = pipeline.DF.string
+                        self.forwarding_print["EX/DF -> RF/EX"] = f"({src_string}) to ({instruction.string})"
+                        del hazards[instruction]
+                    elif (regs[1] == pipeline.WB.regs[0]) and (pipeline.WB in hazards.get(instruction, ())):
                         self.forwarding_counts["DS/WB -> RF/EX"] += 1
-                        src1_value = self.registers[operands[1]]
-                        src2_value = self.pipeline_registers["RF/EX"]["B"]
-                        src_string = self.forwarding_detected[instruction["string"]][0]
-                        self.forwarding_print["DS/WB -> RF/EX"] = f"({src_string}) to ({instruction['string']})"
-                        del self.forwarding_detected[instruction["string"]]
+                        self.total_forwardings += 1
+                        src1_value = registers[regs[1]]
+                        src2_value = latches.rf_ex_b
+                        src_string = pipeline.WB.string
+                        self.forwarding_print["DS/WB -> RF/EX"] = f"({src_string}) to ({instruction.string})"
+                        del hazards[instruction]
                     else:
-                        src1_value = self.pipeline_registers["RF/EX"]["A"]
-                        src2_value = self.pipeline_registers["RF/EX"]["B"]
+                        src1_value = latches.rf_ex_a
+                        src2_value = latches.rf_ex_b
                 else:
-                    if (instruction["string"] in self.forwarding_detected) and (operands[1] == self.pipeline["DF"]["operands"][0]):
+                    if (regs[1] == pipeline.DF.regs[0]) and (pipeline.DF in hazards.get(instruction, ())):
                         self.forwarding_counts["EX/DF -> RF/EX"] += 1
-                        src1_value = self.pipeline_registers["DF/DS"]["ALUout_LMD"]
-                        src2_value = self.pipeline_registers["RF/EX"]["B"]
-                        src_string = self.forwarding_detected[instruction["string"]][0]
-                        self.forwarding_print["EX/DF -> RF/EX"] = f"({src_string}) to ({instruction['string']})"
-                        del self.forwarding_detected[instruction["string"]]
-                    elif (instruction["string"] in self.forwarding_detected) and (operands[2] == self.pipeline["DF"]["operands"][0]):
+                        self.total_forwardings += 1
+                        src1_value = latches.df_ds_aluout_lmd
+                        src2_value = latches.rf_ex_b
+                        src_string = pipeline.DF.string
+                        self.forwarding_print["EX/DF -> RF/EX"] = f"({src_string}) to ({instruction.string})"
+                        del hazards[instruction]
+                    elif (regs[2] == pipeline.DF.regs[0]) and (pipeline.DF in hazards.get(instruction, ())):
                         self.forwarding_counts["EX/DF -> RF/EX"] += 1
-                        src1_value = self.pipeline_registers["RF/EX"]["A"]
-                        src2_value = self.pipeline_registers["DF/DS"]["ALUout_LMD"]
-                        src_string = self.forwarding_detected[instruction["string"]][0]
-                        self.forwarding_print["EX/DF -> RF/EX"] = f"({src_string}) to ({instruction['string']})"
-                        del self.forwarding_detected[instruction["string"]]
+                        self.total_forwardings += 1
+                        src1_value = latches.rf_ex_a
+                        src2_value = latches.df_ds_aluout_lmd
+                        src_string = pipeline.DF.string
+                        self.forwarding_print["EX/DF -> RF/EX"] = f"({src_string}) to ({instruction.string})"
+                        del hazards[instruction]
                     else:
-                        src1_value = self.pipeline_registers["RF/EX"]["A"]
-                        src2_value = self.pipeline_registers["RF/EX"]["B"]
+                        src1_value = latches.rf_ex_a
+                        src2_value = latches.rf_ex_b
 
+                # Registers are 32 bits, results that can grow past that wrap around
                 if operation == "ADD":
-                    result = src1_value + src2_value
+                    result = to_word(src1_value + src2_value)
                 elif operation == "SUB":
-                    result = src1_value - src2_value
+                    result = to_word(src1_value - src2_value)
                 elif operation == "ADDI":
-                    immediate = int(operands[2])
-                    result = src1_value + immediate
+                    result = to_word(src1_value + instruction.imm)
                 elif operation == "SLL":
-                    result = src1_value << src2_value
+                    result = to_word(src1_value << src2_value)
                 elif operation == "SRL":
                     result = src1_value >> src2_value
                 elif operation == "AND":
@@ -311,60 +479,57 @@ class PipelineSimulator:
                 elif operation == "SLT":
                     result = 1 if src1_value < src2_value else 0
                 elif operation == "SLTI":
-                    result = 1 if src1_value < int(operands[2]) else 0
-                self.pipeline_registers["EX/DF"]["ALUout"] = result
-                self.pipeline_registers["EX/DF"]["B"] = src2_value
+                    result = 1 if src1_value < instruction.imm else 0
+                latches.ex_df_aluout = result
+                latches.ex_df_b = src2_value
 
             elif operation == "SW":
 
-                base_operand = operands[1]
-                match = re.match(r'.*\((R\d+)\)', base_operand)
-                base_reg = match.group(1)
-                if (instruction["string"] in self.forwarding_detected) and (base_reg == self.pipeline["DF"]["operands"][0]):
+                if (instruction.base == pipeline.DF.regs[0]) and (pipeline.DF in hazards.get(instruction, ())):
                     self.forwarding_counts["EX/DF -> RF/EX"] += 1
-                    base_value = self.pipeline_registers["DF/DS"]["ALUout_LMD"]
-                    address = base_value + 600
-                    self.pipeline_registers["EX/DF"]["ALUout"] = address
-                    self.pipeline_registers["EX/DF"]["B"] = self.registers[operands[0]]
-                    src_string = self.forwarding_detected[instruction["string"]][0]
-                    self.forwarding_print["EX/DF -> RF/EX"] = f"({src_string}) to ({instruction['string']})"
-                    del self.forwarding_detected[instruction["string"]]
+                    self.total_forwardings += 1
+                    base_value = latches.df_ds_aluout_lmd
+                    address = base_value + instruction.imm
+                    latches.ex_df_aluout = address
+                    latches.ex_df_b = registers[regs[0]]
+                    src_string = pipeline.DF.string
+                    self.forwarding_print["EX/DF -> RF/EX"] = f"({src_string}) to ({instruction.string})"
+                    del hazards[instruction]
                 else:
-                    base_value = self.pipeline_registers["RF/EX"]["A"]
-                    address = base_value + 600
-                    self.pipeline_registers["EX/DF"]["ALUout"] = address
-                    self.pipeline_registers["EX/DF"]["B"] = self.registers[operands[0]]
+                    base_value = latches.rf_ex_a
+                    address = base_value + instruction.imm
+                    latches.ex_df_aluout = address
+                    latches.ex_df_b = registers[regs[0]]
             elif operation == "LW":
-                base_operand = operands[1]
-                match = re.match(r'.*\((R\d+)\)', base_operand)
-                base_reg = match.group(1)
-                if (instruction["string"] in self.forwarding_detected) and (base_reg == self.pipeline["DF"]["operands"][0]):
+                if (instruction.base == pipeline.DF.regs[0]) and (pipeline.DF in hazards.get(instruction, ())):
                     self.forwarding_counts["EX/DF -> RF/EX"] += 1
-                    base_value = self.pipeline_registers["DF/DS"]["ALUout_LMD"]
-                    address = base_value + 600
-                    self.pipeline_registers["EX/DF"]["ALUout"] = address
-                    src_string = self.forwarding_detected[instruction["string"]][0]
-                    self.forwarding_print["EX/DF -> RF/EX"] = f"({src_string}) to ({instruction['string']})"
-                    del self.forwarding_detected[instruction["string"]]
-                    self.pipeline_registers["EX/DF"]["B"] = 0
+                    self.total_forwardings += 1
+                    base_value = latches.df_ds_aluout_lmd
+                    address = base_value + instruction.imm
+                    latches.ex_df_aluout = address
+                    src_string = pipeline.DF.string
+                    self.forwarding_print["EX/DF -> RF/EX"] = f"({src_string}) to ({instruction.string})"
+                    del hazards[instruction]
+                    latches.ex_df_b = 0
                 else:
-                    base_value = self.pipeline_registers["RF/EX"]["A"]
-                    address = base_value + 600
-                    self.pipeline_registers["EX/DF"]["ALUout"] = address
-                    self.pipeline_registers["EX/DF"]["B"] = self.pipeline_registers["RF/EX"]["B"]
+                    base_value = latches.rf_ex_a
+                    address = base_value + instruction.imm
+                    latches.ex_df_aluout = address
+                    latches.ex_df_b = latches.rf_ex_b
 
             elif operation in ["BEQ", "BNE", "BLT", "BGE"]:
 
-                if (instruction["string"] in self.forwarding_detected) and (operands[0] == self.pipeline["DF"]["operands"][0]):
+                if (regs[0] == pipeline.DF.regs[0]) and (pipeline.DF in hazards.get(instruction, ())):
                     self.forwarding_counts["EX/DF -> RF/EX"] += 1
-                    src1_value = self.pipeline_registers["DF/DS"]["ALUout_LMD"]
-                    src2_value = self.pipeline_registers["RF/EX"]["B"]
-                    src_string = self.forwarding_detected[instruction["string"]][0]
-                    self.forwarding_print["EX/DF -> RF/EX"] = f"({src_string}) to ({instruction['string']})"
-                    del self.forwarding_detected[instruction["string"]]
+                    self.total_forwardings += 1
+                    src1_value = latches.df_ds_aluout_lmd
+                    src2_value = latches.rf_ex_b
+                    src_string = pipeline.DF.string
+                    self.forwarding_print["EX/DF -> RF/EX"] = f"({src_string}) to ({instruction.string})"
+                    del hazards[instruction]
                 else:
-                    src1_value = self.pipeline_registers["RF/EX"]["A"]
-                    src2_value = self.pipeline_registers["RF/EX"]["B"]
+                    src1_value = latches.rf_ex_a
+                    src2_value = latches.rf_ex_b
 
                 branch_taken = False
                 if operation == "BEQ" and src1_value == src2_value:
@@ -376,249 +541,298 @@ class PipelineSimulator:
                 elif operation == "BGE" and src1_value >= src2_value:
                     branch_taken = True
 
-                self.pipeline_registers["EX/DF"]["B"] = self.pipeline_registers["RF/EX"]["B"]
-                self.pipeline_registers["EX/DF"]["ALUout"] = 556
+                latches.ex_df_b = latches.rf_ex_b
+                latches.ex_df_aluout = 556
                 if branch_taken:
-                    offset = int(operands[2])  
+                    offset = instruction.imm
                     self.pc = self.pc + offset
                     self.is_pipeline_complete = True
 
             elif operation in ["J", "JAL", "JALR"]:
                 if operation == "JAL":
-                    offset = int(operands[1])
-                    self.registers[operands[0]] = self.pc + 4  
+                    offset = instruction.imm
+                    registers[regs[0]] = self.pc + 4  
                     self.pc = self.pc + offset
                 elif operation == "JALR":
-                    base_value = self.pipeline_registers["RF/EX"]["A"]
-                    self.registers[operands[0]] = self.pc + 4  
-                    self.pc = base_value + int(operands[1])
+                    base_value = latches.rf_ex_a
+                    registers[regs[0]] = self.pc + 4  
+                    self.pc = base_value + instruction.imm
                 elif operation == "J":
-                    self.pipeline_registers["EX/DF"]["ALUout"] = int(operands[0])
-                    self.pipeline_registers["EX/DF"]["B"] = 0
+                    latches.ex_df_aluout = instruction.imm
+                    latches.ex_df_b = 0
         else:
-            self.pipeline_registers["EX/DF"]["ALUout"] = 0
-            self.pipeline_registers["EX/DF"]["B"] = 0
-
-
-        if self.pipeline["RF"]["operation"] != "NOP" and not self.stall_flag:
-            instruction = self.pipeline["RF"]
-            operation = instruction["operation"]
-            operands = instruction["operands"]
+            latches.ex_df_aluout = 0
+            latches.ex_df_b = 0
+        if timer is not None:
+            timer("EX")
+
+        # RF Stage - Read registers, the producer is entered in the scoreboard here
+        if pipeline.RF.operation != "NOP" and not self.stall_flag:
+            instruction = pipeline.RF
+            operation = instruction.operation
+            regs = instruction.regs
+
+            # First operand is the destination for everything but stores and branches
+            dest_reg = regs[0]
+            if dest_reg is not None and operation not in ["SW", "BEQ", "BNE", "BLT", "BGE"]:
+                scoreboard.issue(dest_reg, instruction, self.clock_cycle, LOAD_LATENCY if operation == "LW" else ALU_LATENCY)
 
             if operation in ["ADD", "SUB", "ADDI", "SLL", "SRL", "AND", "OR", "XOR", "SLT", "SLTI"]:
                 # te first operand is always the destination register, the second is the source register.
-                src1 = operands[1]  
-                self.pipeline_registers["RF/EX"]["A"] = self.registers[src1]
+                latches.rf_ex_a = registers[regs[1]]
 
                 if operation in ["ADD", "SUB", "SLL", "SRL", "AND", "OR", "XOR", "SLT"]:
-                    if len(operands) > 2:
-                        src2 = operands[2] 
-                        if src2.startswith('R'):
-                            self.pipeline_registers["RF/EX"]["B"] = self.registers[src2]
-                        else:
-                            self.pipeline_registers["RF/EX"]["B"] = int(src2)
+                    latches.rf_ex_b = registers[regs[2]]
 
             elif operation in ["SW", "LW"]:
-                base_operand = operands[1]  
-                match = re.match(r'.*\((R\d+)\)', base_operand)
-                base_reg = match.group(1) 
-
-                self.pipeline_registers["RF/EX"]["A"] = self.registers[base_reg]
+                latches.rf_ex_a = registers[instruction.base]
                 if operation == "SW":
                     # For SW also need the value to be stored, operand[1]
-                    src_value = operands[0]
-                    self.pipeline_registers["RF/EX"]["B"] = self.registers[src_value]
+                    latches.rf_ex_b = registers[regs[0]]
                 if operation == "LW":
-                    just_stalled = False
-                    if len(self.pipeline["ID"]["operands"]) > 2:
-                        if operands[0] == self.pipeline["ID"]["operands"][1] or operands[0] == self.pipeline["ID"]["operands"][2]:
-                            self.stall_counter += 2
-                            just_stalled = True
-                    if not just_stalled and operands[0] == self.pipeline["ID"]["operands"][1]:
-                        self.stall_counter += 2
-                        just_stalled = True
-                    if not just_stalled and len(self.pipeline["IS"]["operands"]) > 2:
-                        if operands[0] == self.pipeline["IS"]["operands"][1] or operands[0] == self.pipeline["IS"]["operands"][2]:
-                            self.stall_counter += 1
-                            just_stalled = True
-                    if not just_stalled and operands[0] == self.pipeline["IS"]["operands"][1]:
-                        self.stall_counter += 1
-                        just_stalled = True
+                    # Load-use hazard: the consumer in ID reaches RF next cycle, the one in IS the cycle after.
+                    # Stall it until the load's result is ready
+                    ready_cycle = scoreboard.ready_cycle(dest_reg)
+                    if dest_reg == pipeline.ID.regs[1] or dest_reg == pipeline.ID.regs[2]:
+                        self.stall_counter += ready_cycle - (self.clock_cycle + 1)
+                    elif dest_reg == pipeline.IS.regs[1] or dest_reg == pipeline.IS.regs[2]:
+                        self.stall_counter += ready_cycle - (self.clock_cycle + 2)
 
             elif operation == "BEQ":
-                self.pipeline_registers["RF/EX"]["A"] = self.registers[operands[0]]
-                self.pipeline_registers["RF/EX"]["B"] = self.registers[operands[1]]
+                latches.rf_ex_a = registers[regs[0]]
+                latches.rf_ex_b = registers[regs[1]]
             elif operation == "J":
-                self.pipeline_registers["RF/EX"]["A"] = 0
-                self.pipeline_registers["RF/EX"]["B"] = 0
-
+                latches.rf_ex_a = 0
+                latches.rf_ex_b = 0
+        if timer is not None:
+            timer("RF")
 
         # ID Stage - Decode Instruction
-        if self.pipeline["ID"]["operation"] != "NOP" and not self.stall_flag:
-            instruction_in_id = self.pipeline["ID"]
+        if pipeline.ID.operation != "NOP" and not self.stall_flag:
+            instruction_in_id = pipeline.ID
 
-            operation = instruction_in_id["operation"]
-            operands = instruction_in_id["operands"]
+            operation = instruction_in_id.operation
+            regs = instruction_in_id.regs
             src1 = None
             src2 = None
 
             if operation in ["SW"]:
-                src1 = operands[0]
-                match = re.match(r'.*\((R\d+)\)', operands[1])
-                src2 = match.group(1)
+                src1 = regs[0]
+                src2 = instruction_in_id.base
             elif operation in ["LW"]:
-                match = re.match(r'.*\((R\d+)\)', operands[1])
-                src1 = match.group(1)
+                src1 = instruction_in_id.base
                 src2 = None
             elif operation in ["BEQ", "BNE", "BLT", "BGE"]:
-                src1 = operands[0]
-                src2 = operands[1]
+                src1 = regs[0]
+                src2 = regs[1]
             else:
                 # identify sources
-                src1 = operands[1] if len(operands) > 1 and operands[1].startswith('R') else None
-                src2 = operands[2] if len(operands) > 2 and operands[2].startswith('R') else None
-
-            for stage in ["RF", "EX", "DF"]:
-                if self.pipeline[stage]["operation"] != "NOP":
-                    producing_instruction = self.pipeline[stage]
-                    dest_reg = producing_instruction["operands"][0] if producing_instruction["operands"] else None
-                    if producing_instruction["operation"] == "SW":
-                        dest_reg = None
-
-                    # RAW hazard check
-                    if dest_reg and (src1 == dest_reg or src2 == dest_reg):
-                        if instruction_in_id["string"] not in self.forwarding_detected:
-                            self.forwarding_detected[instruction_in_id["string"]] = []
-                        if producing_instruction["string"] not in self.forwarding_detected[instruction_in_id["string"]]:
-                            self.forwarding_detected[instruction_in_id["string"]].append(producing_instruction["string"])
-
+                src1 = regs[1]
+                src2 = regs[2]
+
+            # RAW hazard check, producers still in RF, EX or DF, youngest first
+            producers = []
+            for src in (src1, src2):
+                if src is not None:
+                    producers.extend(scoreboard.producers_within(src, self.clock_cycle, 2))
+            if producers:
+                producers.sort(key=lambda entry: -entry[0])
+                detected = []
+                for _, producer in producers:
+                    if producer not in detected:
+                        detected.append(producer)
+                hazards[instruction_in_id] = detected
+            elif instruction_in_id in hazards:
+                del hazards[instruction_in_id]
+        if timer is not None:
+            timer("ID")
 
         # IS Stage
         # Update IR register in IS/ID pipeline register
-        if self.pipeline["IS"] != {"operation": "NOP", "operands": [], "address": None} and not self.stall_flag:
-            self.pipeline_registers["IS/ID"]["IR"] = self.pipeline["IS"]
+        if pipeline.IS is not FETCH_NOP and not self.stall_flag:
+            latches.is_id_ir = pipeline.IS
+        if timer is not None:
+            timer("IS")
 
         # IF Stage
-        if self.pc < 496 + len(self.instructions) * 4 and not self.stall_flag:
+        if self.pc < 496 + len(self.decoded_instructions) * 4 and not self.stall_flag:
             next_instruction_index = (self.pc - 496) // 4
-            self.pipeline["IF"] = self.parse_instruction(self.instructions[next_instruction_index])
-            self.pipeline_registers["IF/IS"]["NPC"] = self.pc + 4
+            pipeline.IF = self.decoded_instructions[next_instruction_index]
+            if pipeline.IF.operation != "NOP":
+                self.in_flight += 1
+            latches.if_is_npc = self.pc + 4
         elif not self.stall_flag:
-            self.pipeline["IF"] = {"operation": "NOP", "operands": [], "address": None}
+            pipeline.IF = FETCH_NOP
+        if timer is not None:
+            timer("IF")
 
         self.print_pipeline_trace()
+        if timer is not None:
+            timer("trace")
 
-        self.forwarding_print = {        #This just for resetting forwarding printouts after each iteration
-            "EX/DF -> RF/EX": "",
-            "DF/DS -> EX/DF": "",
-            "DF/DS -> RF/EX": "",
-            "DS/WB -> EX/DF": "",
-            "DS/WB -> RF/EX": ""
-        }
+        # Binary trace record, PC step and the all-NOP completion check
+        if self.binary_trace is not None and self.in_trace_window():
+            self.binary_trace.write_cycle(self)
+
+        if self.total_forwardings != self.forwardings_printed:
+            # Something was forwarded this cycle, clear the printouts for the next one
+            self.forwarding_print = dict.fromkeys(self.forwarding_print, "")
+            self.forwardings_printed = self.total_forwardings
         if self.stall_counter == 0:
             self.pc += 4
 
-
-        if all(stage["operation"] == "NOP" for stage in self.pipeline.values()):
+        if not self.in_flight:
             self.is_pipeline_complete = True
 
 
+    def in_trace_window(self):
+        # A missing start or end leaves that side of the window open
+        return (self.trace_start is None or self.trace_start <= self.clock_cycle) and \
+            (self.trace_end is None or self.clock_cycle <= self.trace_end)
+
     def print_pipeline_trace(self):
-        if (self.trace_start is None and self.trace_end is None) or \
-        (self.trace_start <= self.clock_cycle <= self.trace_end):
-            to_print = []
-            to_print.append(f"***** Cycle #{self.clock_cycle}***********************************************")
-            to_print.append(f"Current PC = {self.pc}:")
-            to_print.append("Pipeline Status:")
-            for stage, instr in self.pipeline.items():
-                operation = "<unknown>" if stage == "IF" else instr["string"]
-                to_print.append(f"* {stage} : {operation}")
-            to_print.append(" ")
-            stall_instr = self.pipeline["ID"] if self.pipeline["ID"] == "** STALL **" else "(none)"
-            to_print.append(f"Stall Instruction: {stall_instr}\n")
-
-            to_print.append("Forwarding:")
-            if self.pipeline["ID"]["operation"] != "NOP" and not self.stall_flag:
-                current_instruction = self.pipeline["ID"]["string"]
-                detected_forwarding = [
-                    f"({src_string}) to ({current_instruction})"
-                    for src_string in self.forwarding_detected.get(current_instruction, [])
-                ]
-                lw_not_detected = True
-                for src_string in self.forwarding_detected.get(current_instruction, []):
-                    if "LW" in src_string:
-                        lw_not_detected = False
-                if detected_forwarding and lw_not_detected:
-                    to_print.append(" Detected: ")
-                    for forward in detected_forwarding:
-                        to_print.append(f"\t{forward}")
-                else:
-                    to_print.append(" Detected: (none)")
-            else:
-                to_print.append(" Detected: (none)")
-
-            to_print.append(" Forwarded:")
-            for path, count in self.forwarding_print.items():
-                to_print.append(f" * {path} : {count}")
-            to_print.append(" ")
-
-            to_print.append("Pipeline Registers:")
-            for reg, values in self.pipeline_registers.items():
-                if not reg == "DF/DS":
-                    for key, value in values.items():
-                        to_print.append(f"* {reg}.{key}\t: {value}")
-            to_print.append(" ")
-
-            to_print.append("Integer registers:")
-            for i in range(0, 32, 4):
-                to_print.append(f"R{i}\t{self.registers[f'R{i}']}\tR{i+1}\t{self.registers[f'R{i+1}']}\tR{i+2}\t{self.registers[f'R{i+2}']}\tR{i+3}\t{self.registers[f'R{i+3}']}")
-            to_print.append(" ")
-
-            to_print.append("Data memory:")
-            for addr in range(600, 640, 4):
-                to_print.append(f"{addr}: {self.memory.get(addr, 0)}")
-            to_print.append(" ")
-
-            to_print.append("Total Stalls:")
-            to_print.append(f"*Loads\t: {self.load_stalls}")
-            to_print.append(f"*Branches: {self.branch_stalls}")
-            to_print.append(f"*Other\t: {self.other_stalls}\n")
-
-            to_print.append("Total Forwardings:")
-            for path, count in self.forwarding_counts.items():
-                to_print.append(f" * {path} : {count}")
-            to_print.append(" ")
-
-            if self.output_file_name_2:
-                with open(self.output_file_name_2, 'a') as file:
-                    file.write("\n".join(to_print) + "\n")
-
-            print("\n".join(to_print))
+        if self.trace_writer.summary_only:
+            return
+        if self.in_trace_window():
+            self.trace_writer.write_record(self.trace_record())
+
+    def trace_record(self):
+        # Everything the trace prints for this cycle as a CycleRecord (trace_writer.py). The record only holds
+        # copies and immutable values, so it can be formatted later, on another thread, while the simulator moves on
+        pipeline = self.pipeline
+        stages = tuple((stage, "<unknown>" if stage == "IF" else instr.string) for stage, instr in pipeline.items())
+        stall_instr = pipeline.ID if pipeline.ID == "** STALL **" else "(none)"
+
+        detected = None
+        if pipeline.ID.operation != "NOP" and not self.stall_flag:
+            current_instruction = pipeline.ID.string
+            producers = self.hazards.get(pipeline.ID, [])
+            detected_forwarding = tuple(f"({producer.string}) to ({current_instruction})" for producer in producers)
+            lw_not_detected = True
+            for producer in producers:
+                if "LW" in producer.string:
+                    lw_not_detected = False
+            if detected_forwarding and lw_not_detected:
+                detected = detected_forwarding
+
+        # Delta mode: only every delta_trace_interval'th traced cycle is a full keyframe, the cycles in between
+        # only carry what changed since the previous traced cycle
+        stalls = (self.load_stalls, self.branch_stalls, self.other_stalls)
+        keyframe = not self.delta_trace_interval or self.traced_cycles % self.delta_trace_interval == 0
+        self.traced_cycles += 1
+        if keyframe:
+            forwarded = tuple(self.forwarding_print.items())
+            latch_values = tuple(self.pipeline_registers.items())
+            registers = tuple(self.registers)
+            memory_values = tuple(self.memory.window_words())
+            forwarding_counts = tuple(self.forwarding_counts.items())
+            if self.delta_trace_interval:
+                self.previous_trace_state = ([value for _, _, value in latch_values], list(registers),
+                                             [value for _, value in memory_values], list(stalls),
+                                             list(self.forwarding_counts.values()))
+        else:
+            forwarded = tuple(item for item in self.forwarding_print.items() if item[1])
+            latch_values, registers, memory_values, stalls, forwarding_counts = self.trace_changes(stalls)
+
+        return CycleRecord(self.clock_cycle, self.pc, stages, stall_instr, detected, forwarded, keyframe,
+                           latch_values, registers, memory_values, stalls, forwarding_counts)
+
+    def trace_changes(self, stalls):
+        # The parts of a delta record: what differs from the state saved at the previous traced cycle, which is
+        # brought up to date in place. Registers as (number, value), stalls as (index into load/branch/other, value)
+        previous_latches, previous_registers, previous_memory, previous_stalls, previous_forwarding = \
+            self.previous_trace_state
+
+        latch_values = []
+        for i, (latch, field, value) in enumerate(self.pipeline_registers.items()):
+            previous = previous_latches[i]
+            if value is not previous and value != previous:
+                latch_values.append((latch, field, value))
+                previous_latches[i] = value
+
+        registers = []
+        for i, value in enumerate(self.registers):
+            if value != previous_registers[i]:
+                registers.append((i, value))
+                previous_registers[i] = value
+
+        # Only SW writes memory while the pipeline runs, the window is only looked at on a cycle that stored
+        memory_values = []
+        if self.stored_word is not None:
+            for i, (address, value) in enumerate(self.memory.window_words()):
+                if value != previous_memory[i]:
+                    memory_values.append((address, value))
+                    previous_memory[i] = value
+
+        stall_changes = []
+        for i, value in enumerate(stalls):
+            if value != previous_stalls[i]:
+                stall_changes.append((i, value))
+                previous_stalls[i] = value
+
+        forwarding_counts = []
+        for i, (path, count) in enumerate(self.forwarding_counts.items()):
+            if count != previous_forwarding[i]:
+                forwarding_counts.append((path, count))
+                previous_forwarding[i] = count
+
+        return tuple(latch_values), tuple(registers), tuple(memory_values), tuple(stall_changes), \
+            tuple(forwarding_counts)
+
+    def summary(self):
+        # End of run counters as a flat dict (what print_final_summary prints, minus registers and memory)
+        stats = {
+            "cycles": self.clock_cycle,
+            "total_stalls": self.total_stalls,
+            "load_stalls": self.load_stalls,
+            "branch_stalls": self.branch_stalls,
+            "other_stalls": self.other_stalls,
+            "total_forwardings": self.total_forwardings,
+        }
+        stats.update(self.forwarding_counts)
+        return stats
+
+    def live_stats(self):
+        # Progress of the run so far, only reads the running totals so it's cheap to poll at any point, also from
+        # another thread while simulate() is going
+        cycles = self.clock_cycle
+        return {
+            "cycles": cycles,
+            "pc": self.pc,
+            "retired": self.retired,
+            "ipc": self.retired / cycles if cycles else 0.0,
+            "in_flight": self.in_flight,
+            "total_stalls": self.total_stalls,
+            "load_stalls": self.load_stalls,
+            "branch_stalls": self.branch_stalls,
+            "stall_rate": self.total_stalls / cycles if cycles else 0.0,
+            "total_forwardings": self.total_forwardings,
+            "complete": self.is_pipeline_complete,
+        }
 
     def print_final_summary(self):
+        stats = self.summary()
         summary_lines = []
         summary_lines.append("\nFinal Simulation Summary:")
-        summary_lines.append(f"Total Cycles: {self.clock_cycle}")
-        self.total_stalls = self.load_stalls + self.branch_stalls
-        summary_lines.append(f"Total Stalls: {self.total_stalls}")
-        summary_lines.append(f"  Load Stalls: {self.load_stalls}")
-        summary_lines.append(f"  Branch Stalls: {self.branch_stalls}")
-        summary_lines.append(f"  Other Stalls: {self.other_stalls}")
-        self.total_forwardings = sum(self.forwarding_counts.values())
-        summary_lines.append(f"Total Forwardings: {self.total_forwardings}")
+        summary_lines.append(f"Total Cycles: {stats['cycles']}")
+        summary_lines.append(f"Total Stalls: {stats['total_stalls']}")
+        summary_lines.append(f"  Load Stalls: {stats['load_stalls']}")
+        summary_lines.append(f"  Branch Stalls: {stats['branch_stalls']}")
+        summary_lines.append(f"  Other Stalls: {stats['other_stalls']}")
+        summary_lines.append(f"Total Forwardings: {stats['total_forwardings']}")
         summary_lines.append(" ")
 
         summary_lines.append("\nRegisters:")
-        for reg, value in self.registers.items():
-            summary_lines.append(f"  {reg}: {value}")
+        for i, value in enumerate(self.registers):
+            summary_lines.append(f"  R{i}: {value}")
         summary_lines.append(" ")
 
         summary_lines.append("\nMemory:")
-        for addr in range(600, 640, 4):
-            summary_lines.append(f"  {addr}: {self.memory[addr]}")
+        for addr, value in self.memory.window_words():
+            summary_lines.append(f"  {addr}: {value}")
+        # Anything the program stored outside the fixed window
+        for addr, value in self.memory.words_outside_window():
+            summary_lines.append(f"  {addr}: {value}")
         summary_lines.append(" ")
 
-        if self.output_file_name_2:
-            with open(self.output_file_name_2, 'a') as file:
-                file.write("\n".join(summary_lines) + "\n")
-        print("\n".join(summary_lines))
+        self.trace_writer.write_summary("\n".join(summary_lines) + "\n")
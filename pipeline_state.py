@@ -0,0 +1,165 @@
+# pipeline_state.py
+# Compact containers for the simulator state: decoded instructions, the 8 pipeline stages and the latches
+
+import re
+from array import array
+
+STAGES = ("IF", "IS", "ID", "RF", "EX", "DF", "DS", "WB")
+
+REGISTER_OPERAND = re.compile(r'R(\d+)$')
+
+# Producers per register the scoreboard remembers, enough to cover RF, EX and DF
+SCOREBOARD_DEPTH = 3
+
+
+class Instruction:
+    # One decoded instruction. Built once per program line and shared by every fetch of that address,
+    # so nothing in the simulator is allowed to modify it
+    __slots__ = ("string", "operation", "operands", "address", "regs", "imm", "base")
+
+    def __init__(self, string, operation, operands, address, imm=None, base=None):
+        self.string = string
+        self.operation = operation
+        self.operands = tuple(operands)
+        self.address = address
+        self.imm = imm      # immediate, branch offset, J target or LW/SW address offset
+        self.base = base    # LW/SW base register number
+        # Register number of each of the first 3 operands, None when that operand isn't a plain register
+        regs = []
+        for i in range(3):
+            match = REGISTER_OPERAND.match(self.operands[i]) if i < len(self.operands) and self.operands[i] else None
+            regs.append(int(match.group(1)) if match else None)
+        self.regs = tuple(regs)
+
+    def __repr__(self):
+        # Same layout the trace has always printed for the IS/ID.IR latch
+        return repr({"string": self.string, "operation": self.operation, "operands": list(self.operands), "address": self.address})
+
+
+class Bubble(Instruction):
+    # NOP / stall placeholders that aren't tied to a program address. Only a handful exist (below)
+    __slots__ = ()
+
+    def __init__(self, string, operands):
+        Instruction.__init__(self, string, "NOP", operands, None)
+
+    def __repr__(self):
+        return repr({"operation": self.operation, "operands": list(self.operands), "address": self.address, "string": self.string})
+
+    def __reduce__(self):
+        # The simulator compares bubbles by identity, so unpickling (e.g. in a worker process) has to give back
+        # the shared object rather than a copy
+        return (bubble_from_code, (instruction_code(self),))
+
+
+# Shared bubbles, the simulator only ever assigns these and never builds new NOP objects per cycle
+INITIAL_NOP = Bubble("NOP", [])                     # what every stage holds before cycle 0
+FETCH_NOP = Bubble("NOP", [])                       # IF when nothing was fetched this cycle
+DATA_NOP = Bubble("NOP", [None, None, None])        # fetched a data word / short line
+STALL = Bubble("** STALL **", [None, None, None])   # bubble inserted by a load stall or a J flush
+IS_STALL = Bubble("** STALL **", [])                # bubble a J flush puts in IS
+
+
+class Pipeline:
+    # Which instruction sits in each stage
+    __slots__ = STAGES
+
+    def __init__(self, nop):
+        for stage in STAGES:
+            setattr(self, stage, nop)
+
+    def items(self):
+        return [(stage, getattr(self, stage)) for stage in STAGES]
+
+    def values(self):
+        return [getattr(self, stage) for stage in STAGES]
+
+
+# (latch, field, attribute) in the order the trace prints them
+LATCH_FIELDS = (
+    ("IF/IS", "NPC", "if_is_npc"),
+    ("IS/ID", "IR", "is_id_ir"),
+    ("RF/EX", "A", "rf_ex_a"),
+    ("RF/EX", "B", "rf_ex_b"),
+    ("EX/DF", "ALUout", "ex_df_aluout"),
+    ("EX/DF", "B", "ex_df_b"),
+    ("DF/DS", "ALUout_LMD", "df_ds_aluout_lmd"),
+    ("DF/DS", "ALUout_LMD_B", "df_ds_aluout_lmd_b"),
+    ("DS/WB", "ALUout_LMD", "ds_wb_aluout_lmd"),
+)
+
+
+class PipelineRegisters:
+    # All inter-stage latches flattened into one object
+    __slots__ = tuple(attr for _, _, attr in LATCH_FIELDS)
+
+    def __init__(self, nop):
+        self.if_is_npc = 0
+        self.is_id_ir = nop
+        self.rf_ex_a = 0
+        self.rf_ex_b = 0
+        self.ex_df_aluout = 0
+        self.ex_df_b = 0
+        self.df_ds_aluout_lmd = 0
+        self.df_ds_aluout_lmd_b = 0
+        self.ds_wb_aluout_lmd = 0
+
+    def items(self):
+        return [(latch, field, getattr(self, attr)) for latch, field, attr in LATCH_FIELDS]
+
+
+class Scoreboard:
+    # RAW hazard bookkeeping per register number: the in-flight instructions writing it, youngest first, each as
+    # (cycle it entered RF, cycle its result is ready, instruction). Nothing after RF ever stalls, so a producer
+    # that issued at cycle c is in RF, EX, DF, DS, WB at cycles c .. c + 4 and its stage is just clock - c.
+    # Only the last SCOREBOARD_DEPTH writers are kept, older ones are past DF and can't be a hazard any more
+    __slots__ = ("entries",)
+
+    def __init__(self):
+        self.entries = [()] * 32
+
+    def issue(self, reg, instruction, cycle, latency):
+        self.entries[reg] = ((cycle, cycle + latency, instruction),) + self.entries[reg][:SCOREBOARD_DEPTH - 1]
+
+    def ready_cycle(self, reg):
+        return self.entries[reg][0][1]
+
+    def producers_within(self, reg, cycle, distance):
+        # (issue cycle, instruction) of every producer of reg that issued at most `distance` stages ago
+        # (0 = still in RF), youngest first
+        return [(issue, instruction) for issue, _, instruction in self.entries[reg] if cycle - issue <= distance]
+
+    def squash(self, cycle, distance):
+        # Forget producers that were flushed, i.e. issued at most `distance` stages ago
+        for reg, entries in enumerate(self.entries):
+            if entries and cycle - entries[0][0] <= distance:
+                self.entries[reg] = tuple(entry for entry in entries if cycle - entry[0] > distance)
+
+    def clear(self):
+        self.entries = [()] * 32
+
+
+def new_register_file():
+    # Integer register file, R0..R31 indexed by register number. Values are 32 bit words (see memory.to_word)
+    return array('q', [0] * 32)
+
+
+# Fixed codes for the shared bubbles when a stage occupant has to be stored as a number (binary trace, checkpoints).
+# Real instructions are stored as their index into the decoded program, (address - 496) // 4
+BUBBLES = (INITIAL_NOP, FETCH_NOP, DATA_NOP, STALL, IS_STALL)
+
+
+def instruction_code(instruction):
+    if isinstance(instruction, Bubble):
+        return -1 - BUBBLES.index(instruction)
+    return (instruction.address - 496) // 4
+
+
+def bubble_from_code(code):
+    return BUBBLES[-1 - code]
+
+
+def instruction_from_code(code, decoded_instructions):
+    if code < 0:
+        return BUBBLES[-1 - code]
+    return decoded_instructions[code]
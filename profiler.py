@@ -0,0 +1,138 @@
+# profiler.py
+# Optional instrumentation for PipelineSimulator. attach() gives that one simulator instance a section timer,
+# which advance_pipeline calls as it finishes each section, and a wrapper around advance_pipeline for the per-cycle
+# counters; detach() takes both off again. An unprofiled simulator only pays for the `timer is not None` checks.
+#
+# Collected per run:
+#   section_time --> wall time spent in each section of the cycle (the stages, the trace printer, end of cycle)
+#   occupancy    --> cycles each stage held a program instruction (not a NOP/stall bubble)
+#   pc_executed  --> times each address reached WB
+#   pc_cycles    --> cycles each address spent in the pipeline, summed over the stages it was in
+#   pc_stalls    --> stall cycles charged to each address: load-use stalls to the consumer held in ID, the 4
+#                    bubbles of a J flush to the J
+# Cycles run on the functional model (--fast-forward) aren't seen
+
+import csv
+import time
+
+from pipeline_state import STAGES
+
+# Sections of advance_pipeline in the order they run. Everything after the trace section is "end of cycle"
+SECTIONS = ("shift", "WB", "DS", "DF", "EX", "RF", "ID", "IS", "IF", "trace", "end of cycle")
+
+
+class Profiler:
+
+    def __init__(self, on_cycle=None):
+        # on_cycle --> called as on_cycle(sim) after every cycle the profiler sees
+        self.on_cycle = on_cycle
+        self.sim = None
+        self.cycles = 0
+        self.cycle_time = 0.0   # wall time in advance_pipeline, sections plus the profiler's clock reads
+        self.section_time = {section: 0.0 for section in SECTIONS}
+        self.section_start = 0.0
+        self.occupancy = {stage: 0 for stage in STAGES}
+        self.pc_executed = {}
+        self.pc_cycles = {}
+        self.pc_stalls = {}
+
+    def attach(self, sim):
+        self.sim = sim
+        sim.section_timer = self.end_section
+        sim.advance_pipeline = self.profiled_cycle(sim, sim.advance_pipeline)
+
+    def detach(self):
+        self.sim.section_timer = None
+        del self.sim.advance_pipeline
+
+    def end_section(self, section):
+        # Charges the time since the previous section ended to this one
+        now = time.perf_counter()
+        self.section_time[section] += now - self.section_start
+        self.section_start = now
+
+    def profiled_cycle(self, sim, advance_pipeline):
+        clock = time.perf_counter
+
+        def run():
+            start = self.section_start = clock()
+            advance_pipeline()
+            end = clock()
+            self.section_time["end of cycle"] += end - self.section_start
+            self.cycle_time += end - start
+            self.count_cycle(sim)
+            if self.on_cycle is not None:
+                self.on_cycle(sim)
+        return run
+
+    def count_cycle(self, sim):
+        # Per stage and per PC counters for the cycle that just ran
+        pipeline = sim.pipeline
+        occupancy = self.occupancy
+        pc_cycles = self.pc_cycles
+        self.cycles += 1
+        for stage in STAGES:
+            address = getattr(pipeline, stage).address
+            if address is not None:  # bubbles have no address
+                occupancy[stage] += 1
+                pc_cycles[address] = pc_cycles.get(address, 0) + 1
+
+        if pipeline.WB.address is not None:
+            self.pc_executed[pipeline.WB.address] = self.pc_executed.get(pipeline.WB.address, 0) + 1
+        if sim.stall_flag and pipeline.ID.address is not None:
+            self.pc_stalls[pipeline.ID.address] = self.pc_stalls.get(pipeline.ID.address, 0) + 1
+        if pipeline.DF.operation == "J":
+            self.pc_stalls[pipeline.DF.address] = self.pc_stalls.get(pipeline.DF.address, 0) + 4
+
+    def flat_profile(self):
+        # Rows of section, seconds, share of the time in advance_pipeline and microseconds per cycle, slowest first.
+        # The sections cover the whole cycle, the profiler's own clock reads land in the section they end
+        total = self.cycle_time
+        times = self.section_time
+        rows = []
+        for section, seconds in sorted(times.items(), key=lambda item: -item[1]):
+            rows.append({
+                "section": section,
+                "seconds": seconds,
+                "percent": 100 * seconds / total if total else 0.0,
+                "us_per_cycle": 1e6 * seconds / self.cycles if self.cycles else 0.0,
+            })
+        return rows
+
+    def heatmap(self):
+        # One row per address that was ever in the pipeline, in address order
+        sim = self.sim
+        rows = []
+        for address in sorted(self.pc_cycles):
+            index = (address - 496) // 4
+            instruction = sim.decoded_instructions[index] if sim and 0 <= index < len(sim.decoded_instructions) else None
+            rows.append({
+                "address": address,
+                "instruction": instruction.string.strip() if instruction is not None else "",
+                "executed": self.pc_executed.get(address, 0),
+                "cycles": self.pc_cycles[address],
+                "stalls": self.pc_stalls.get(address, 0),
+            })
+        return rows
+
+    def write_profile(self, file_name):
+        lines = [f"Profiled cycles: {self.cycles}",
+                 f"Time in advance_pipeline: {self.cycle_time:.6f} s "
+                 f"({1e6 * self.cycle_time / self.cycles if self.cycles else 0.0:.2f} us/cycle)",
+                 "",
+                 f"{'section':<14}{'seconds':>12}{'%':>8}{'us/cycle':>11}"]
+        for row in self.flat_profile():
+            lines.append(f"{row['section']:<14}{row['seconds']:>12.6f}{row['percent']:>8.1f}{row['us_per_cycle']:>11.3f}")
+        lines.append("")
+        lines.append(f"{'stage':<14}{'occupied':>12}{'%':>8}")
+        for stage in STAGES:
+            busy = self.occupancy[stage]
+            lines.append(f"{stage:<14}{busy:>12}{100 * busy / self.cycles if self.cycles else 0.0:>8.1f}")
+        with open(file_name, 'w') as file:
+            file.write("\n".join(lines) + "\n")
+
+    def write_heatmap(self, file_name):
+        with open(file_name, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=["address", "instruction", "executed", "cycles", "stalls"])
+            writer.writeheader()
+            writer.writerows(self.heatmap())
@@ -0,0 +1,185 @@
+# result_cache.py
+# Persistent cache of main.py results. A run is keyed by a hash of the input image, the options that change the
+# output and the simulator's own source, so an entry can only be reused when the result couldn't be different.
+# An entry holds what the run produced: the listing, what it appended to the simulator output file (trace and
+# summary) and what it printed. All of it is gzip compressed, one file per entry.
+#
+# The cache is kept under max_bytes by dropping the least recently used entries (a file's mtime is its last use).
+# Entries bigger than a quarter of the cache aren't stored at all.
+
+import glob
+import gzip
+import hashlib
+import json
+import os
+import sys
+import tempfile
+
+CACHE_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+                                 "risc_v_simulator")
+DEFAULT_MAX_BYTES = 256 << 20
+
+source_hash = None
+
+
+def source_fingerprint():
+    # Hash of every module next to this one, a change to any of them invalidates the whole cache
+    global source_hash
+    if source_hash is None:
+        digest = hashlib.sha256()
+        for file_name in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "*.py"))):
+            digest.update(os.path.basename(file_name).encode())
+            with open(file_name, 'rb') as file:
+                digest.update(file.read())
+        source_hash = digest.hexdigest()
+    return source_hash
+
+
+def file_digest(file_name):
+    digest = hashlib.sha256()
+    with open(file_name, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class TeeOutput:
+    # Stands in for sys.stdout during a recorded run: passes everything through and keeps a copy, up to limit
+    # characters. Past that the copy is dropped and overflowed is set
+
+    def __init__(self, stream, limit):
+        self.stream = stream
+        self.limit = limit
+        self.parts = []
+        self.size = 0
+        self.overflowed = False
+
+    def write(self, text):
+        if not self.overflowed:
+            self.size += len(text)
+            if self.size > self.limit:
+                self.overflowed = True
+                self.parts = []
+            else:
+                self.parts.append(text)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def getvalue(self):
+        return "".join(self.parts)
+
+
+def read_appended(file_name, offset, compress):
+    # Text appended to file_name after offset. A gzip file appended to gets a new member, which decompresses alone
+    with open(file_name, 'rb') as file:
+        file.seek(offset)
+        data = file.read()
+    if compress:
+        data = gzip.decompress(data)
+    return data.decode()
+
+
+class ResultCache:
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def key(self, operation, input_file_name, config):
+        # config --> dict of the options that change the output, must be JSON serializable
+        digest = hashlib.sha256()
+        digest.update(json.dumps({"version": CACHE_VERSION, "source": source_fingerprint(), "operation": operation,
+                                  "input": file_digest(input_file_name), "config": config},
+                                 sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def entry_file_name(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".json.gz")
+
+    def load(self, key):
+        # The stored entry dict, or None on a miss. A hit counts as a use for the LRU order
+        file_name = self.entry_file_name(key)
+        try:
+            with gzip.open(file_name, 'rt') as file:
+                entry = json.load(file)
+            os.utime(file_name)
+        except (OSError, ValueError, EOFError):
+            return None
+        return entry
+
+    def store(self, key, entry):
+        data = gzip.compress(json.dumps(entry).encode())
+        if len(data) > self.max_bytes // 4:
+            return False
+        file_name = self.entry_file_name(key)
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        # Written next to the final name and renamed, so a reader never sees half an entry
+        handle, temp_name = tempfile.mkstemp(dir=os.path.dirname(file_name), suffix=".tmp")
+        with os.fdopen(handle, 'wb') as file:
+            file.write(data)
+        os.replace(temp_name, file_name)
+        self.evict()
+        return True
+
+    def evict(self):
+        # Drops least recently used entries until the cache fits in max_bytes
+        entries = []
+        total = 0
+        for file_name in glob.glob(os.path.join(self.cache_dir, "*", "*.json.gz")):
+            try:
+                stat = os.stat(file_name)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, file_name))
+            total += stat.st_size
+        entries.sort()
+        for _, size, file_name in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(file_name)
+            except OSError:
+                pass
+            total -= size
+
+    def record(self, run, listing_file_name=None, output_file_name=None, compress=False):
+        # Runs run() with stdout captured. Returns the entry for what it produced, or None if it was too big.
+        # listing_file_name --> file run() writes from scratch, output_file_name --> file run() appends to
+        limit = self.max_bytes // 4
+        offset = os.path.getsize(output_file_name) if output_file_name and os.path.exists(output_file_name) else 0
+        tee = TeeOutput(sys.stdout, limit)
+        sys.stdout = tee
+        try:
+            run()
+        finally:
+            sys.stdout = tee.stream
+        if tee.overflowed:
+            return None
+
+        entry = {"stdout": tee.getvalue()}
+        for name, file_name in (("listing", listing_file_name), ("output", output_file_name)):
+            if not file_name:
+                continue
+            start = offset if name == "output" else 0
+            if os.path.getsize(file_name) - start > limit:
+                return None
+            entry[name] = read_appended(file_name, start, compress and name == "output")
+        return entry
+
+    def replay(self, entry, listing_file_name=None, output_file_name=None, compress=False):
+        # Produces the same stdout and files the recorded run did
+        sys.stdout.write(entry["stdout"])
+        sys.stdout.flush()
+        if listing_file_name:
+            with open(listing_file_name, 'w') as file:
+                file.write(entry["listing"])
+        if output_file_name:
+            if compress:
+                with gzip.open(output_file_name, 'at') as file:
+                    file.write(entry["output"])
+            else:
+                with open(output_file_name, 'a') as file:
+                    file.write(entry["output"])
@@ -0,0 +1,97 @@
+# sweep.py
+# Run one program under many simulator configurations on a process pool and collect the final summaries
+# into a single CSV or JSON table.
+#
+# Usage: python sweep.py <spec.json> <results.csv|results.json> [--jobs n]
+#
+# spec.json:
+# {
+#   "input": "fib_input.txt",
+#   "runs": [
+#     {"name": "full", "trace": "0:2000"},
+#     {"name": "late", "trace": "60:2000", "fast_forward": true},
+#     {"name": "seeded", "trace": "0:2000", "memory": {"600": 3, "604": 4}}
+#   ]
+# }
+#
+# trace --> m:n window, same as -T (the run stops at cycle n). Defaults to 0:100000
+# fast_forward --> run the cycles before m on the functional model
+# memory --> words written into data memory before the run starts
+
+import argparse
+import csv
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+from disassembler import Disassembler
+from pipeline_simulator import PipelineSimulator
+from trace_writer import TraceWriter
+
+DEFAULT_TRACE = "0:100000"
+
+# Set once per worker process by init_worker
+worker_program = None
+
+
+def decode_program(input_file_name):
+    # Disassemble and decode the program once, in the parent process. Only the decoded form is shipped to the
+    # workers, the records are dropped here
+    records = Disassembler(input_file_name, None).decode()
+    prototype = PipelineSimulator(records, trace_writer=TraceWriter(None, echo=False))
+    return prototype.decoded_program()
+
+
+def init_worker(program):
+    global worker_program
+    worker_program = program
+
+
+def run_config(config):
+    trace_start, trace_end = map(int, config.get("trace", DEFAULT_TRACE).split(":"))
+    sim = PipelineSimulator(None, trace_start, trace_end, trace_writer=TraceWriter(None, echo=False, summary_only=True),
+                            decoded=worker_program)
+    sim.memory.load_words((int(address), value) for address, value in config.get("memory", {}).items())
+    sim.simulate(config.get("fast_forward", False))
+
+    row = {
+        "name": config.get("name", ""),
+        "trace": f"{trace_start}:{trace_end}",
+        "fast_forward": bool(config.get("fast_forward", False)),
+    }
+    row.update(sim.summary())
+    return row
+
+
+def run_sweep(spec, jobs=None):
+    # Returns one result row per entry in spec["runs"], in the same order
+    program = decode_program(spec["input"])
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(program,)) as pool:
+        return list(pool.map(run_config, spec["runs"]))
+
+
+def write_results(rows, output_file_name):
+    if output_file_name.endswith(".json"):
+        with open(output_file_name, 'w') as file:
+            json.dump(rows, file, indent=2)
+        return
+    with open(output_file_name, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=list(rows[0].keys()) if rows else ["name"])
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RISC-V Simulator parameter sweep")
+    parser.add_argument("spec_file_name", help="JSON sweep spec")
+    parser.add_argument("output_file_name", help="results table, .csv or .json")
+    parser.add_argument('--jobs', metavar="n", type=int, help="Worker processes (default: one per CPU)")
+    args = parser.parse_args()
+
+    with open(args.spec_file_name, 'r') as file:
+        spec = json.load(file)
+    rows = run_sweep(spec, args.jobs)
+    write_results(rows, args.output_file_name)
+
+
+if __name__ == "__main__":
+    main()
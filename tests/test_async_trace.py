@@ -0,0 +1,36 @@
+# A trace writer worker that dies takes the run down with it instead of leaving a truncated trace
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from disassembler import Disassembler
+from pipeline_simulator import PipelineSimulator
+from trace_writer import AsyncTraceWriter
+from workloads import generate_preset, write_program
+
+
+def mixed_program(tmp_path):
+    input_file_name = str(tmp_path / "mixed.txt")
+    write_program(generate_preset("mixed", 256), input_file_name)
+    return Disassembler(input_file_name, None).decode()
+
+
+def test_thread_worker_error_is_raised(tmp_path):
+    trace_writer = AsyncTraceWriter(str(tmp_path / "missing" / "trace.txt"), echo=False)
+    sim = PipelineSimulator(mixed_program(tmp_path), 0, 500, trace_writer=trace_writer)
+    with pytest.raises(FileNotFoundError):
+        sim.simulate()
+
+
+def test_thread_worker_writes_the_trace(tmp_path):
+    file_name = str(tmp_path / "trace.txt")
+    sim = PipelineSimulator(mixed_program(tmp_path), 0, 50, trace_writer=AsyncTraceWriter(file_name, echo=False))
+    sim.simulate()
+    with open(file_name) as file:
+        text = file.read()
+    assert text.count("***** Cycle #") == 50
+    assert "Final Simulation Summary" in text
@@ -0,0 +1,29 @@
+# Binary trace round trip for values the text trace handles, like a store to a negative address
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from binary_trace import BinaryTraceReader, BinaryTraceWriter
+from pipeline_simulator import PipelineSimulator
+from trace_writer import TraceWriter
+
+# x1 = 5, then stored to -8(x0) once the ADDI has written back
+NEGATIVE_STORE = ["ADDI  x1, x0, 5"] + ["ADDI  x0, x0, 0"] * 6 + ["SW    x1, -8(x0)"]
+
+
+def test_negative_store_address(tmp_path):
+    trace_file_name = str(tmp_path / "trace.bin")
+    listing = [f"0000000 00000 000 00000 00000 0000000\t{496 + 4 * i}\t{text}" for i, text in enumerate(NEGATIVE_STORE)]
+    sim = PipelineSimulator(listing, 0, 100, trace_writer=TraceWriter(None, echo=False),
+                            binary_trace=BinaryTraceWriter(trace_file_name))
+    sim.simulate()
+    assert sim.memory[-8] == 5
+
+    reader = BinaryTraceReader(trace_file_name)
+    try:
+        stores = [delta for record in reader for delta in record.memory_deltas]
+        assert stores == [(-8, 5)]
+    finally:
+        reader.close()
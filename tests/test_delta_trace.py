@@ -0,0 +1,74 @@
+# A delta trace, applied on top of its keyframes, gives the same state as the full trace every cycle
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from disassembler import Disassembler
+from pipeline_simulator import PipelineSimulator
+from trace_writer import TraceWriter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Blocks that carry state, keyed by their header without the " (changed)" a delta cycle adds
+STATE_BLOCKS = ["Pipeline Registers", "Integer registers", "Data memory", "Total Stalls", "Total Forwardings"]
+
+
+def trace_text(listing, delta_trace_interval, tmp_path):
+    trace_file_name = str(tmp_path / f"trace_{delta_trace_interval}.txt")
+    sim = PipelineSimulator(listing, 0, 2000, trace_writer=TraceWriter(trace_file_name, echo=False),
+                            delta_trace_interval=delta_trace_interval)
+    sim.simulate()
+    with open(trace_file_name, 'r') as file:
+        return file.read()
+
+
+def parse_cycles(text):
+    # [(header lines, forwarded {path: text}, {block: {name: value}})] per cycle, the summary is left out
+    cycles = []
+    for chunk in text.split("***** Cycle #")[1:]:
+        chunk = chunk.split("\nFinal Simulation Summary:")[0]
+        lines = chunk.split("\n")
+        header = lines[:lines.index("Forwarding:")]
+        forwarded = {}
+        blocks = {}
+        block = None
+        for line in lines[lines.index(" Forwarded:") + 1:]:
+            if line.endswith(":") and line.replace(" (changed)", "")[:-1] in STATE_BLOCKS:
+                block = blocks.setdefault(line.replace(" (changed)", "")[:-1], {})
+            elif not line.strip():
+                continue
+            elif block is None:
+                path, _, value = line[3:].partition(" : ")
+                forwarded[path] = value
+            elif block == blocks.get("Integer registers"):
+                fields = line.split("\t")
+                block.update(zip(fields[::2], fields[1::2]))
+            else:
+                # Latch values can contain ": " themselves, their separator has a tab in front
+                name, _, value = line.partition("\t: ") if "\t: " in line else line.partition(": ")
+                block[name.strip()] = value
+        cycles.append((header, forwarded, blocks))
+    return cycles
+
+
+def test_deltas_rebuild_the_full_state(tmp_path):
+    listing_file_name = str(tmp_path / "listing.txt")
+    Disassembler(os.path.join(ROOT, "fib_input.txt"), listing_file_name).disassemble()
+    with open(listing_file_name, 'r') as file:
+        listing = [line.strip() for line in file if line.strip()]
+
+    full = parse_cycles(trace_text(listing, 0, tmp_path))
+    delta = parse_cycles(trace_text(listing, 7, tmp_path))
+    assert len(full) == len(delta)
+    state = {}
+    for cycle, ((header, forwarded, blocks), (delta_header, delta_forwarded, changes)) in enumerate(zip(full, delta)):
+        assert delta_header == header
+        if cycle % 7 == 0:
+            assert changes == blocks
+        else:
+            assert delta_forwarded == {path: text for path, text in forwarded.items() if text}
+            assert "Data memory" not in changes or changes["Data memory"]
+        for name, values in changes.items():
+            state.setdefault(name, {}).update(values)
+        assert state == blocks
@@ -0,0 +1,67 @@
+# --fast-forward only starts from an empty pipeline, and never undoes a restored checkpoint
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from disassembler import Disassembler
+from pipeline_simulator import PipelineSimulator
+from trace_writer import TraceWriter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MEMORY_WINDOW = range(600, 640, 4)
+
+
+@pytest.fixture
+def fib_listing(tmp_path):
+    listing_file_name = str(tmp_path / "fib_listing.txt")
+    Disassembler(os.path.join(ROOT, "fib_input.txt"), listing_file_name).disassemble()
+    with open(listing_file_name, 'r') as file:
+        return [line.strip() for line in file if line.strip()]
+
+
+def simulator(listing, trace_start, trace_end):
+    return PipelineSimulator(listing, trace_start, trace_end,
+                             trace_writer=TraceWriter(None, echo=False, summary_only=True))
+
+
+def final_memory(sim):
+    return [sim.memory.get(address, 0) for address in MEMORY_WINDOW]
+
+
+def test_fast_forward_from_start(fib_listing):
+    reference = simulator(fib_listing, 0, 2000)
+    reference.simulate()
+    sim = simulator(fib_listing, 60, 2000)
+    sim.simulate(fast_forward=True)
+    assert final_memory(sim) == final_memory(reference)
+    assert final_memory(sim)[-1] == 55
+
+
+def test_restore_past_trace_start_keeps_state(fib_listing, tmp_path):
+    # Restored at cycle 80 with the window starting at 60: nothing left to fast-forward
+    checkpointed = simulator(fib_listing, 0, 2000)
+    checkpointed.checkpoint_interval = 40
+    checkpointed.checkpoint_dir = str(tmp_path)
+    checkpointed.simulate()
+
+    sim = simulator(fib_listing, 60, 2000)
+    sim.restore_checkpoint_at(str(tmp_path), 80)
+    sim.simulate(fast_forward=True)
+    assert sim.clock_cycle == checkpointed.clock_cycle
+    assert final_memory(sim) == final_memory(checkpointed)
+
+
+def test_fast_forward_refuses_a_full_pipeline(fib_listing, tmp_path):
+    checkpointed = simulator(fib_listing, 0, 2000)
+    checkpointed.checkpoint_interval = 40
+    checkpointed.checkpoint_dir = str(tmp_path)
+    checkpointed.simulate()
+
+    sim = simulator(fib_listing, 60, 2000)
+    sim.restore_checkpoint_at(str(tmp_path), 40)
+    with pytest.raises(ValueError):
+        sim.simulate(fast_forward=True)
@@ -0,0 +1,37 @@
+# The summary lists what the program stored outside the window, not the data section it was loaded with
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory import PagedMemory
+
+
+def test_loaded_words_are_not_listed():
+    memory = PagedMemory()
+    memory.load_words([(4096, 7), (4100, 8), (600, 1)])
+    memory[8192] = 3
+    memory[4100] = 9
+    memory[604] = 2
+    memory[12288] = 0
+    assert memory.words_outside_window() == [(4100, 9), (8192, 3)]
+
+
+def test_stored_addresses_survive_a_snapshot():
+    memory = PagedMemory()
+    memory.load_words([(4096, 7)])
+    memory[8192] = 3
+    restored = PagedMemory()
+    restored.restore(memory.snapshot(), memory.stored)
+    assert restored[4096] == 7
+    assert restored.words_outside_window() == [(8192, 3)]
+
+
+def test_get_default_for_unallocated_pages():
+    memory = PagedMemory()
+    memory[600] = 5
+    assert memory.get(600) == 5
+    assert memory.get(604, None) == 0
+    assert memory.get(1 << 20, None) is None
+    assert memory.get(1 << 20) == 0
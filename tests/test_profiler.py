@@ -0,0 +1,38 @@
+# The profiler times the sections of the plain advance_pipeline and leaves nothing behind when detached
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from disassembler import Disassembler
+from pipeline_simulator import PipelineSimulator
+from profiler import Profiler, SECTIONS
+from trace_writer import TraceWriter
+from workloads import generate_preset, write_program
+
+
+def new_simulator(tmp_path):
+    input_file_name = str(tmp_path / "mixed.txt")
+    write_program(generate_preset("mixed", 256), input_file_name)
+    return PipelineSimulator(Disassembler(input_file_name, None).decode(), 0, 500,
+                             trace_writer=TraceWriter(None, echo=False, summary_only=True))
+
+
+def test_profiled_run_matches_plain_run(tmp_path):
+    plain = new_simulator(tmp_path)
+    plain.simulate()
+
+    sim = new_simulator(tmp_path)
+    profiler = Profiler()
+    profiler.attach(sim)
+    sim.simulate()
+    assert sim.summary() == plain.summary()
+    assert profiler.cycles == sim.clock_cycle
+    assert set(profiler.section_time) == set(SECTIONS)
+    assert all(seconds > 0 for seconds in profiler.section_time.values())
+    assert sum(profiler.section_time.values()) <= profiler.cycle_time
+
+    profiler.detach()
+    assert sim.section_timer is None
+    assert "advance_pipeline" not in vars(sim)
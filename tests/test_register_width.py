@@ -0,0 +1,72 @@
+# Registers hold 32 bit words: results that don't fit wrap around instead of overflowing the register file
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from functional_simulator import FunctionalSimulator
+from pipeline_simulator import PipelineSimulator
+from trace_writer import TraceWriter
+
+# 1 << 63 and 1 << 40 drop out of the low 32 bits, 1 << 31 lands on the sign bit
+LARGE_SHIFTS = ["ADDI  x1, x0, 1", "ADDI  x2, x0, 63", "ADDI  x5, x0, 40", "ADDI  x7, x0, 31",
+                "SLL   x3, x1, x2", "SLL   x4, x1, x5", "SLL   x8, x1, x7", "SLL   x6, x4, x5"]
+# x1 = 2^30, doubled by ADDs: 2^31 wraps to -2^31, 2^32 wraps to 0
+ADD_CHAIN = ["ADDI  x1, x0, 1", "ADDI  x2, x0, 30", "SLL   x1, x1, x2", "ADD   x3, x1, x1", "ADD   x4, x3, x3",
+             "SUB   x5, x4, x1", "ADDI  x6, x3, -1"]
+NOP = "ADDI  x0, x0, 0"
+# Every instruction is followed by this many NOPs so the results don't depend on forwarding
+SPACING = 6
+
+
+def listing(body):
+    # Disassembler listing lines for body, the simulator only reads the address and the assembly
+    lines = []
+    for instruction in body:
+        for text in [instruction] + [NOP] * SPACING:
+            lines.append(f"0000000 00000 000 00000 00000 0000000\t{496 + 4 * len(lines)}\t{text}")
+    return lines
+
+
+def pipeline_registers(body, tmp_path):
+    sim = PipelineSimulator(listing(body), 1000, 1000, str(tmp_path / "trace.txt"))
+    sim.simulate()
+    assert sim.is_pipeline_complete
+    return sim.registers
+
+
+def functional_registers(body, use_blocks):
+    sim = PipelineSimulator(listing(body), 1000, 1000, trace_writer=TraceWriter(None, echo=False, summary_only=True))
+    FunctionalSimulator(sim, use_blocks).run(1000)
+    return sim.registers
+
+
+def check_large_shifts(registers):
+    assert registers[3] == 0
+    assert registers[4] == 0
+    assert registers[6] == 0
+    assert registers[8] == -2 ** 31
+
+
+def check_add_chain(registers):
+    assert registers[1] == 2 ** 30
+    assert registers[3] == -2 ** 31
+    assert registers[4] == 0
+    assert registers[5] == -2 ** 30
+    assert registers[6] == 2 ** 31 - 1
+
+
+def test_large_shifts_wrap(tmp_path):
+    check_large_shifts(pipeline_registers(LARGE_SHIFTS, tmp_path))
+
+
+def test_add_chain_wraps(tmp_path):
+    check_add_chain(pipeline_registers(ADD_CHAIN, tmp_path))
+
+
+def test_functional_model_wraps():
+    # --fast-forward's interpreter and its compiled blocks
+    for use_blocks in (False, True):
+        check_large_shifts(functional_registers(LARGE_SHIFTS, use_blocks))
+        check_add_chain(functional_registers(ADD_CHAIN, use_blocks))
@@ -0,0 +1,287 @@
+# trace_writer.py
+# Where the simulator's per-cycle trace and final summary end up. The simulator hands over one CycleRecord per
+# traced cycle, format_cycle turns it into the text block. TraceWriter formats and writes it right away,
+# AsyncTraceWriter does both on a background thread (or process) fed through a bounded queue
+
+import gzip
+import multiprocessing
+import queue
+import sys
+import threading
+from collections import namedtuple
+
+# One traced cycle, built by PipelineSimulator.trace_record. Only tuples, numbers, strings and (immutable)
+# Instruction objects, so a record can be formatted long after the simulator has moved on
+#   stages     --> (stage, text) for the 8 stages
+#   detected   --> "(producer) to (consumer)" strings, None prints "(none)"
+#   forwarded  --> (path, text) of the forwards done this cycle
+#   keyframe   --> the full state: latches (latch, field, value), the 32 registers, memory (address, value) of the
+#                  window, stalls (load, branch, other) and forwarding_counts (path, count).
+#                  Otherwise (delta mode) each of those only holds what changed since the previous traced cycle:
+#                  registers as (number, value), stalls as (index, value), and forwarded skips the idle paths
+CycleRecord = namedtuple("CycleRecord", ["cycle", "pc", "stages", "stall_instruction", "detected", "forwarded",
+                                         "keyframe", "latches", "registers", "memory", "stalls", "forwarding_counts"])
+
+# Stall counter labels of the delta blocks, by index into stalls
+STALL_LABELS = ("*Loads\t", "*Branches", "*Other\t")
+
+
+def format_cycle(record):
+    to_print = []
+    to_print.append(f"***** Cycle #{record.cycle}***********************************************")
+    to_print.append(f"Current PC = {record.pc}:")
+    to_print.append("Pipeline Status:")
+    for stage, operation in record.stages:
+        to_print.append(f"* {stage} : {operation}")
+    to_print.append(" ")
+    to_print.append(f"Stall Instruction: {record.stall_instruction}\n")
+
+    to_print.append("Forwarding:")
+    if record.detected:
+        to_print.append(" Detected: ")
+        for forward in record.detected:
+            to_print.append(f"\t{forward}")
+    else:
+        to_print.append(" Detected: (none)")
+
+    to_print.append(" Forwarded:")
+    for path, count in record.forwarded:
+        to_print.append(f" * {path} : {count}")
+    to_print.append(" ")
+
+    registers = record.registers
+    if record.keyframe:
+        to_print.append("Pipeline Registers:")
+        for reg, key, value in record.latches:
+            if not reg == "DF/DS":
+                to_print.append(f"* {reg}.{key}\t: {value}")
+        to_print.append(" ")
+
+        to_print.append("Integer registers:")
+        for i in range(0, 32, 4):
+            to_print.append(f"R{i}\t{registers[i]}\tR{i+1}\t{registers[i+1]}\tR{i+2}\t{registers[i+2]}\tR{i+3}\t{registers[i+3]}")
+        to_print.append(" ")
+
+        to_print.append("Data memory:")
+        for addr, value in record.memory:
+            to_print.append(f"{addr}: {value}")
+        to_print.append(" ")
+
+        load_stalls, branch_stalls, other_stalls = record.stalls
+        to_print.append("Total Stalls:")
+        to_print.append(f"*Loads\t: {load_stalls}")
+        to_print.append(f"*Branches: {branch_stalls}")
+        to_print.append(f"*Other\t: {other_stalls}\n")
+
+        to_print.append("Total Forwardings:")
+        for path, count in record.forwarding_counts:
+            to_print.append(f" * {path} : {count}")
+        to_print.append(" ")
+    else:
+        # Blocks with nothing that changed are left out
+        latches = [(reg, key, value) for reg, key, value in record.latches if not reg == "DF/DS"]
+        if latches:
+            to_print.append("Pipeline Registers (changed):")
+            for reg, key, value in latches:
+                to_print.append(f"* {reg}.{key}\t: {value}")
+            to_print.append(" ")
+
+        if registers:
+            to_print.append("Integer registers (changed):")
+            for i, value in registers:
+                to_print.append(f"R{i}\t{value}")
+            to_print.append(" ")
+
+        if record.memory:
+            to_print.append("Data memory (changed):")
+            for addr, value in record.memory:
+                to_print.append(f"{addr}: {value}")
+            to_print.append(" ")
+
+        if record.stalls:
+            to_print.append("Total Stalls (changed):")
+            for i, value in record.stalls:
+                to_print.append(f"{STALL_LABELS[i]}: {value}")
+            to_print.append(" ")
+
+        if record.forwarding_counts:
+            to_print.append("Total Forwardings (changed):")
+            for path, count in record.forwarding_counts:
+                to_print.append(f" * {path} : {count}")
+            to_print.append(" ")
+    return "\n".join(to_print) + "\n"
+
+
+class TraceWriter:
+
+    def __init__(self, output_file_name=None, echo=True, flush_interval=1000, compress=False, summary_only=False):
+        # output_file_name --> trace file, appended to like before. None means no file
+        # echo --> also write everything to stdout
+        # flush_interval --> flush the file every n cycles, 0 only flushes on close
+        # compress --> gzip the trace file
+        # summary_only --> skip the per-cycle trace, only the final summary is written
+        self.output_file_name = output_file_name
+        self.echo = echo
+        self.flush_interval = flush_interval
+        self.compress = compress
+        self.summary_only = summary_only
+        self.cycles_since_flush = 0
+        self.file = None
+        if output_file_name:
+            # One handle for the whole run instead of reopening the file every cycle
+            if compress:
+                self.file = gzip.open(output_file_name, 'at')
+            else:
+                self.file = open(output_file_name, 'a', buffering=1 << 16)
+
+    def write_cycle(self, text):
+        # text --> one formatted cycle block, newline terminated
+        if self.file:
+            self.file.write(text)
+            self.cycles_since_flush += 1
+            if self.flush_interval and self.cycles_since_flush >= self.flush_interval:
+                self.file.flush()
+                self.cycles_since_flush = 0
+        if self.echo:
+            sys.stdout.write(text)
+
+    def write_record(self, record):
+        self.write_cycle(format_cycle(record))
+
+    def write_summary(self, text):
+        if self.file:
+            self.file.write(text)
+        if self.echo:
+            sys.stdout.write(text)
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+        if self.echo:
+            sys.stdout.flush()
+
+
+class StringTraceWriter(TraceWriter):
+    # Keeps the trace and summary in memory instead of writing them anywhere, getvalue() returns the text
+
+    def __init__(self, summary_only=False):
+        TraceWriter.__init__(self, None, echo=False, summary_only=summary_only)
+        self.parts = []
+
+    def write_cycle(self, text):
+        self.parts.append(text)
+
+    def write_summary(self, text):
+        self.parts.append(text)
+
+    def getvalue(self):
+        return "".join(self.parts)
+
+
+# Records per queue item, so the queue is only touched every ASYNC_BATCH traced cycles
+ASYNC_BATCH = 64
+
+
+def drain_trace_queue(items, writer_args):
+    # Worker side of AsyncTraceWriter: formats and writes everything that comes off the queue, in order,
+    # until the None sentinel
+    writer = TraceWriter(*writer_args)
+    try:
+        while True:
+            item = items.get()
+            if item is None:
+                break
+            kind, payload = item
+            if kind == "records":
+                for record in payload:
+                    writer.write_cycle(format_cycle(record))
+            elif kind == "cycle":
+                writer.write_cycle(payload)
+            else:
+                writer.write_summary(payload)
+    finally:
+        writer.close()
+
+
+class AsyncTraceWriter:
+    # Same output as TraceWriter, but the formatting and the file writes happen on a worker while the simulator
+    # keeps running. The queue holds at most queue_size batches, when the worker is that far behind the simulator
+    # waits for it, so memory stays bounded however long the trace is.
+    # use_process --> format in a separate process instead of a thread. A thread only overlaps the file I/O
+    # (formatting still holds the GIL), a process can format in parallel on another core but every record has
+    # to be pickled over to it
+
+    def __init__(self, output_file_name=None, echo=True, flush_interval=1000, compress=False, summary_only=False,
+                 queue_size=16, use_process=False):
+        self.output_file_name = output_file_name
+        self.summary_only = summary_only
+        self.batch = []
+        self.error = None   # what a thread worker died of, raised by the next put() or close()
+        writer_args = (output_file_name, echo, flush_interval, compress, summary_only)
+        if use_process:
+            self.queue = multiprocessing.Queue(queue_size)
+            self.worker = multiprocessing.Process(target=drain_trace_queue, args=(self.queue, writer_args), daemon=True)
+        else:
+            self.queue = queue.Queue(queue_size)
+            self.worker = threading.Thread(target=self.run_thread_worker, args=(writer_args,), daemon=True)
+        self.worker.start()
+
+    def run_thread_worker(self, writer_args):
+        try:
+            drain_trace_queue(self.queue, writer_args)
+        except Exception as error:
+            self.error = error
+
+    def raise_worker_error(self):
+        # Hands a thread worker's exception over to the simulator's thread, once
+        error = self.error
+        if error is not None:
+            self.error = None
+            raise error
+
+    def put(self, item):
+        # Blocks while the queue is full, but gives up if the worker has died instead of waiting forever
+        while True:
+            self.raise_worker_error()
+            try:
+                self.queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                if not self.worker.is_alive():
+                    self.raise_worker_error()
+                    raise RuntimeError("trace writer worker stopped")
+
+    def flush_batch(self):
+        if self.batch:
+            self.put(("records", self.batch))
+            self.batch = []
+
+    def write_record(self, record):
+        self.batch.append(record)
+        if len(self.batch) >= ASYNC_BATCH:
+            self.flush_batch()
+
+    def write_cycle(self, text):
+        self.flush_batch()
+        self.put(("cycle", text))
+
+    def write_summary(self, text):
+        self.flush_batch()
+        self.put(("summary", text))
+
+    def close(self):
+        # Waits until everything queued so far is written. Raises if the worker died on the way
+        worker = self.worker
+        if worker is None:
+            return
+        try:
+            if worker.is_alive():
+                self.flush_batch()
+                self.put(None)
+            worker.join()
+        finally:
+            self.worker = None
+        self.raise_worker_error()
+        if isinstance(worker, multiprocessing.Process) and worker.exitcode != 0:
+            raise RuntimeError("trace writer worker failed")
@@ -0,0 +1,186 @@
+# workloads.py
+# Synthetic programs for benchmarking. An encoder for the instructions the disassembler knows (the inverse of
+# INSTRUCTION_TABLE), a generator that builds a loop out of a weighted instruction mix, and writers for the
+# input formats the disassembler reads.
+#
+# Every generated program has the same shape:
+#   prologue --> base registers x24..x31 pointed at 2 KB windows of the data section, x9 = 1, x10 = 2
+#   body     --> the instruction mix, looped with a J back to its start (runs until the cycle budget)
+#   RET      --> end of code
+#   data     --> data_words random words, loaded into memory right after the code
+# A taken branch ends the simulation, so the generated branches are all BEQ x9, x10 (1 and 2, never written by
+# the body). The other branches compare whatever RF/EX latched before them, so their outcome isn't predictable
+# from the program. The prologue spaces out dependent instructions with NOPs so it doesn't
+# depend on forwarding
+
+import random
+import struct
+
+from disassembler import INSTRUCTION_TABLE, MNEMONIC_FORMAT
+
+# mnemonic --> (opcode, funct3, funct7), wildcards filled in with the standard encoding
+ENCODING = {}
+for (opcode, funct3, funct7), (mnemonic, _) in INSTRUCTION_TABLE.items():
+    if funct3 is None:
+        funct3 = 0b010 if mnemonic in ["LW", "SW"] else 0
+    ENCODING[mnemonic] = (opcode, funct3, funct7 or 0)
+
+# No SLL/SRL, the simulator shifts by the whole register value and a random chain goes negative or huge
+ALU_R = ["ADD", "SUB", "SLT", "AND", "OR", "XOR"]
+ALU_I = ["ADDI", "SLTI"]
+
+WORK_REGISTERS = list(range(1, 9))       # x1..x8
+BASE_REGISTERS = list(range(24, 32))     # x24..x31, one per 2 KB data window
+SCRATCH_REGISTER = 23
+# Instructions between a prologue write and its first reader
+PROLOGUE_DISTANCE = 6
+NOP = 0b0010011   # ADDI x0, x0, 0
+
+# name --> instruction mix weights (alu, load, load_use, store, branch, jump) and data section size
+PRESETS = {
+    "alu": {"mix": {"alu": 1.0}, "data_words": 16},
+    "load_use": {"mix": {"alu": 0.3, "load_use": 0.5, "store": 0.2}, "data_words": 256},
+    "branchy": {"mix": {"alu": 0.5, "branch": 0.35, "jump": 0.15}, "data_words": 16},
+    "data": {"mix": {"alu": 0.4, "load": 0.35, "store": 0.25}, "data_words": 1 << 16},
+    "mixed": {"mix": {"alu": 0.45, "load": 0.1, "load_use": 0.15, "store": 0.1, "branch": 0.15, "jump": 0.05},
+              "data_words": 1024},
+}
+
+
+def encode(mnemonic, rd=0, rs1=0, rs2=0, imm=0):
+    # One 32 bit word for mnemonic, fields as the disassembler's extract_* functions read them back
+    opcode, funct3, funct7 = ENCODING[mnemonic]
+    fmt = MNEMONIC_FORMAT[mnemonic]
+    word = opcode | (funct3 << 12)
+    if fmt == "R":
+        return word | (rd << 7) | (rs1 << 15) | (rs2 << 20) | (funct7 << 25)
+    if fmt in ["I", "L", "RET"]:
+        return word | (rd << 7) | (rs1 << 15) | ((imm & 0xFFF) << 20)
+    if fmt == "S":
+        imm &= 0xFFF
+        return word | ((imm & 0b11111) << 7) | (rs1 << 15) | (rs2 << 20) | ((imm >> 5) << 25)
+    if fmt == "B":
+        imm &= 0x1FFF
+        return word | (((imm >> 11) & 0b1) << 7) | (((imm >> 1) & 0b1111) << 8) | (rs1 << 15) | (rs2 << 20) | \
+            (((imm >> 5) & 0b111111) << 25) | (((imm >> 12) & 0b1) << 31)
+    # J
+    imm &= 0x1FFFFF
+    return (opcode | (rd << 7) | (((imm >> 12) & 0b11111111) << 12) | (((imm >> 11) & 0b1) << 20) |
+            (((imm >> 1) & 0b1111111111) << 21) | (((imm >> 20) & 0b1) << 31))
+
+
+RET = encode("RET", 0, 1, 0, 0)
+
+
+def prologue(bases):
+    # bases --> values for x24, x25, ... (each < 2^22). Without LUI each one is (value >> 11) << 11 + low 11 bits
+    groups = [
+        [encode("ADDI", SCRATCH_REGISTER, 0, 0, 11), encode("ADDI", 9, 0, 0, 1), encode("ADDI", 10, 0, 0, 2)] +
+        [encode("ADDI", BASE_REGISTERS[i], 0, 0, value >> 11) for i, value in enumerate(bases)],
+        [encode("SLL", BASE_REGISTERS[i], BASE_REGISTERS[i], SCRATCH_REGISTER) for i in range(len(bases))],
+        [encode("ADDI", BASE_REGISTERS[i], BASE_REGISTERS[i], 0, value & 0x7FF) for i, value in enumerate(bases)],
+    ]
+    words = []
+    for group in groups:
+        words.extend(group + [NOP] * PROLOGUE_DISTANCE)
+    return words
+
+
+def generate(instructions=4096, mix=None, data_words=256, seed=0):
+    # Returns the program as a list of 32 bit words. instructions --> length of the loop body
+    rnd = random.Random(seed)
+    mix = mix or PRESETS["mixed"]["mix"]
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+
+    windows = max(1, min(len(BASE_REGISTERS), -(-data_words // 512)))
+    prologue_length = len(prologue([0] * windows))
+    # + J back and RET after the body
+    data_start = 496 + 4 * (prologue_length + instructions + 2)
+    program = prologue([data_start + 2048 * i for i in range(windows)])
+
+    def reg():
+        return rnd.choice(WORK_REGISTERS)
+
+    def data_slot():
+        # (base register, offset) of a random word of the data section
+        index = rnd.randrange(min(data_words, 512 * windows)) if data_words else 0
+        return BASE_REGISTERS[index // 512], 4 * (index % 512)
+
+    body = []
+    previous = reg()  # destination of the last ALU op, the next one reads it so the ops form a chain
+    while len(body) < instructions:
+        kind = rnd.choices(kinds, weights)[0]
+        room = instructions - len(body)
+        if kind == "alu":
+            rd = reg()
+            if rnd.random() < 0.7:
+                body.append(encode(rnd.choice(ALU_R), rd, previous, reg()))
+            else:
+                body.append(encode(rnd.choice(ALU_I), rd, previous, 0, rnd.randint(-64, 64)))
+            previous = rd
+        elif kind == "load":
+            base, offset = data_slot()
+            body.append(encode("LW", reg(), base, 0, offset))
+        elif kind == "load_use" and room >= 2:
+            base, offset = data_slot()
+            rd = reg()
+            body.append(encode("LW", rd, base, 0, offset))
+            body.append(encode(rnd.choice(ALU_R), reg(), rd, rd))
+        elif kind == "store":
+            base, offset = data_slot()
+            body.append(encode("SW", 0, base, reg(), offset))
+        elif kind == "branch":
+            body.append(encode("BEQ", 0, 9, 10, 8))
+        elif kind == "jump" and room >= 2:
+            # Skips the next instruction
+            body.append(encode("J", 0, 0, 0, 8))
+            body.append(encode("ADDI", reg(), reg(), 0, 1))
+        else:
+            body.append(encode("ADD", reg(), previous, reg()))
+    program.extend(body)
+    program.append(encode("J", 0, 0, 0, -4 * len(body)))
+    program.append(RET)
+    program.extend(rnd.randint(-1000, 1000) & 0xFFFFFFFF for _ in range(data_words))
+    return program
+
+
+def generate_preset(name, instructions=4096, data_words=None, seed=0):
+    preset = PRESETS[name]
+    if data_words is None:
+        data_words = preset["data_words"]
+    return generate(instructions, preset["mix"], data_words, seed)
+
+
+def write_text(words, file_name):
+    with open(file_name, 'w') as file:
+        file.write("".join(f"{word:032b}\n" for word in words))
+
+
+def write_binary(words, file_name):
+    with open(file_name, 'wb') as file:
+        file.write(struct.pack(f"<{len(words)}I", *words))
+
+
+def hex_record(record_type, address, data):
+    record = bytes([len(data), (address >> 8) & 0xFF, address & 0xFF, record_type]) + data
+    return f":{(record + bytes([-sum(record) & 0xFF])).hex().upper()}\n"
+
+
+def write_hex(words, file_name):
+    # 16 bytes per data record, an 04 record in front of every 64 KB segment
+    image = struct.pack(f"<{len(words)}I", *words)
+    with open(file_name, 'w') as file:
+        for offset in range(0, len(image), 16):
+            if offset % 0x10000 == 0:
+                file.write(hex_record(0x04, 0, (offset >> 16).to_bytes(2, 'big')))
+            file.write(hex_record(0x00, offset & 0xFFFF, image[offset:offset + 16]))
+        file.write(hex_record(0x01, 0, b""))
+
+
+WRITERS = {"text": write_text, "bin": write_binary, "hex": write_hex}
+EXTENSIONS = {"text": ".txt", "bin": ".bin", "hex": ".hex"}
+
+
+def write_program(words, file_name, output_format="text"):
+    WRITERS[output_format](words, file_name)